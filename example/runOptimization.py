@@ -9,16 +9,18 @@ import sys
 import json
 
 SETTING_FILE = 'opt_settings.json'
+RESULT_FILE = 'opt_results.csv'      # 已完成的优化结果，中断后重新运行时跳过这些参数
 
 def start_optimize_n_output(engine, task, param_mode, opt_engine_setting, folderName, strategy, opt_target):
     for param in task[param_mode]:
         opt_engine_setting.addParameter(param["param_name"], *param["range"])
-    opt_output = engine.runParallelOptimization(strategy, opt_engine_setting)
+    opt_output = engine.runParallelOptimization(strategy, opt_engine_setting, resultFile=RESULT_FILE)
     result_list = []
     col=[]
     for result in opt_output:
         param,target,stat = result
-        param = eval(param)
+        if isinstance(param, str):
+            param = eval(param)
         result_dict = {**param, **stat}
         result_list.append(result_dict)
     col.extend(param.keys())
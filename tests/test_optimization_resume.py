@@ -0,0 +1,116 @@
+# encoding: UTF-8
+"""runParallelOptimization断点续跑测试"""
+
+import csv
+import random
+from datetime import datetime, timedelta
+
+from vnpy.trader.vtStore import DataStore
+from vnpy.trader.vtObject import VtBarData
+from vnpy.trader.app.ctaStrategy.ctaTemplate import CtaTemplate
+from vnpy.trader.app.ctaStrategy.ctaBacktesting import BacktestingEngine, OptimizationSetting
+
+SYMBOLS = ['A:X', 'B:X']
+
+
+########################################################################
+class RandomStrategy(CtaTemplate):
+    """随机下单的测试策略"""
+    className = 'RandomStrategy'
+    symbolList = SYMBOLS
+    seed = 1
+    width = 1.0
+    paramList = ['className', 'symbolList', 'seed', 'width']
+    varList = ['inited', 'trading', 'posDict']
+
+    def onInit(self):
+        self.rng = random.Random(self.seed)
+
+    def onStart(self):
+        pass
+
+    def onOrder(self, order):
+        pass
+
+    def onTrade(self, trade):
+        pass
+
+    def onStopOrder(self, so):
+        pass
+
+    def onBar(self, bar):
+        send = self.rng.choice([self.buy, self.short, self.sell, self.cover])
+        send(bar.vtSymbol, bar.close + self.rng.uniform(-self.width, self.width), 1)
+
+
+#----------------------------------------------------------------------
+def writeBars(path):
+    """生成两天的分钟线"""
+    store = DataStore(path)
+    rng = random.Random(0)
+    start = datetime(2018, 1, 1)
+    for symbol in SYMBOLS:
+        price = 100.0
+        docs = []
+        for i in range(2 * 1440):
+            bar = VtBarData()
+            bar.vtSymbol = bar.symbol = symbol
+            bar.exchange = 'X'
+            bar.datetime = start + timedelta(minutes=i)
+            bar.open = price
+            price = max(1.0, price + rng.gauss(0, 0.3))
+            bar.close = price
+            bar.high = max(bar.open, bar.close) + 0.1
+            bar.low = min(bar.open, bar.close) - 0.1
+            bar.volume = 1
+            docs.append(dict(bar.__dict__))
+        store.write('bar', symbol, docs)
+
+
+#----------------------------------------------------------------------
+def createEngine(tmp_path, messages):
+    """创建回测引擎"""
+    engine = BacktestingEngine()
+    engine.setBacktestingMode(engine.BAR_MODE)
+    engine.setStartDate('20180101 00:00:00', 0)
+    engine.setEndDate('20180102 23:59:00')
+    engine.setContracts({symbol: {'size': 1, 'priceTick': 0.01, 'rate': 0.0005, 'slippage': 0.01}
+                         for symbol in SYMBOLS})
+    engine.setStorePath(str(tmp_path / 'store'))
+    engine.setCachePath(str(tmp_path / 'cache'))
+    engine.output = lambda content, *args, **kwargs: messages.append(content)
+    return engine
+
+
+#----------------------------------------------------------------------
+def test_resume_skips_finished_settings(tmp_path):
+    """第二次运行时结果文件中的参数组合全部跳过，不再启动进程池"""
+    writeBars(str(tmp_path / 'store'))
+    resultFile = str(tmp_path / 'result.csv')
+
+    setting = OptimizationSetting()
+    setting.setOptimizeTarget('sharpeRatio')
+    setting.addParameter('seed', 1, 2, 1)
+    setting.addParameter('width', 1.0, 2.0, 1.0)
+
+    # 策略参数中不带symbolList，由initStrategy根据contractInfo写入
+    firstMessages = []
+    first = createEngine(tmp_path, firstMessages).runParallelOptimization(
+        RandomStrategy, setting, processes=2, resultFile=resultFile)
+    assert len(first) == 4
+    with open(resultFile, newline='', encoding='utf-8') as f:
+        rowCount = len(list(csv.DictReader(f)))
+    assert rowCount == 4
+
+    secondMessages = []
+    engine = createEngine(tmp_path, secondMessages)
+
+    def runOptimizationPool(*args, **kwargs):
+        raise AssertionError(u'续跑时不应再运行参数组合')
+    engine.runOptimizationPool = runOptimizationPool
+
+    second = engine.runParallelOptimization(RandomStrategy, setting, processes=2, resultFile=resultFile)
+    assert u'结果文件中已完成4组参数，剩余0组' in secondMessages
+    assert sorted(result[1] for result in second) == sorted(result[1] for result in first)
+    with open(resultFile, newline='', encoding='utf-8') as f:
+        assert len(list(csv.DictReader(f))) == rowCount
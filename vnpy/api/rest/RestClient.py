@@ -1,10 +1,16 @@
 # encoding: UTF-8
 
 
+import re
 import sys
+import heapq
 import traceback
-from queue import Empty, Queue
+from threading import Lock, RLock
+from time import sleep
+from queue import Empty, Queue, PriorityQueue
 from datetime import datetime
+from itertools import count
+from timeit import default_timer
 from multiprocessing.dummy import Pool
 
 import requests
@@ -20,6 +26,11 @@ class RequestStatus(Enum):
     error = 3  # 发生错误 网络错误、json解析错误，等等
 
 
+# 请求优先级，数值越小越先发出
+PRIORITY_TRADING = 0  # 下单、撤单
+PRIORITY_QUERY = 1  # 账户、持仓、合约等查询
+
+
 ########################################################################
 class Request(object):
     """
@@ -42,6 +53,19 @@ class Request(object):
         self.response = None  # type: requests.Response
         self.status = RequestStatus.ready # type: RequestStatus
 
+        self.priority = PRIORITY_QUERY  # type: int
+        self.bucket = None  # type: TokenBucket  # 所属的限速令牌桶
+        self.addTime = None  # type: float  # 进入队列的时间
+        self.sendTime = None  # type: float  # 开始发送的时间
+
+    #----------------------------------------------------------------------
+    @property
+    def waitTime(self):
+        """在队列中等待的时间（秒），尚未发出时为None"""
+        if self.addTime is None or self.sendTime is None:
+            return None
+        return self.sendTime - self.addTime
+
     #----------------------------------------------------------------------
     def __str__(self):
         if self.response is None:
@@ -49,18 +73,52 @@ class Request(object):
         else:
             statusCode = self.response.status_code
         return ("reuqest : {} {} {} because {}: \n"
+                "wait: {}\n"
                 "headers: {}\n"
                 "params: {}\n"
                 "data: {}\n"
                 "response:"
                 "{}\n"
                 .format(self.method, self.path, self.status.name, statusCode,
+                        self.waitTime,
                         self.headers,
                         self.params,
                         self.data,
                         '' if self.response is None else self.response.text))
 
 
+########################################################################
+class TokenBucket(object):
+    """
+    令牌桶限速
+    按交易所“count次/seconds秒”的规则设置容量和补充速度，
+    使任意seconds秒内发出的请求不超过count次
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, count, seconds):
+        self.capacity = max(1, count // 2)
+        self.rate = float(max(count - self.capacity, 1)) / seconds  # 每秒补充的令牌
+        self.tokens = float(self.capacity)
+        self.last = default_timer()
+        self._lock = Lock()
+
+    #----------------------------------------------------------------------
+    def acquire(self):
+        """
+        尝试取出一个令牌，不阻塞
+        :return: 0表示成功，否则为下一个令牌可用前需要等待的秒数
+        """
+        with self._lock:
+            now = default_timer()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
 ########################################################################
 class RestClient(object):
     """
@@ -70,8 +128,19 @@ class RestClient(object):
     如果需要处理非2xx的请求，请设置onFailed，函数类型请参考defaultOnFailed。
     如果每一个请求的非2xx返回都需要单独处理，使用addReq函数的onFailed参数
     如果捕获Python内部错误，例如网络连接失败等等，请设置onError，函数类型请参考defaultOnError
+    
+    start(n)会启动n个工作线程，每个线程使用独立的keep-alive会话。
+    下单、撤单等非GET请求默认进入交易通道，由其中一个线程单独按提交的先后顺序逐个发出，
+    同一订单的撤单不会先于下单发出，也不会被查询请求阻塞；其余线程并发处理查询请求。
+    也可以通过addRequest的priority参数单独指定通道。
+    所有回调函数（callback、onFailed、onError）都在同一把锁内执行，不会在多个线程中同时运行。
+    
+    如果需要限速，请在子类的rateLimits中声明(method, 路径正则, 次数, 秒数)，
+    匹配的请求会共享一个令牌桶，拿不到令牌的请求延后重新排队，不会占用工作线程。
     """
     
+    rateLimits = []  # [(method, pathPattern, count, seconds)]
+    
     #----------------------------------------------------------------------
     def __init__(self):
         """
@@ -79,8 +148,16 @@ class RestClient(object):
         self.urlBase = None  # type: str
         self._active = False
 
-        self._queue = Queue()
+        self._queue = PriorityQueue()  # 查询请求
+        self._tradingQueue = Queue()  # 交易请求，由单独的线程按顺序发出
+        self._count = count()  # 同一优先级内保持先进先出
+        self._callbackLock = RLock()
         self._pool = None  # type: Pool
+        
+        self._buckets = [(method, re.compile(pattern), TokenBucket(n, seconds))
+                         for method, pattern, n, seconds in self.rateLimits]
+        self._delayed = []  # 被限速延后的请求 [(readyTime, priority, n, request)]
+        self._delayedLock = Lock()
     
     #----------------------------------------------------------------------
     def init(self, urlBase):
@@ -102,8 +179,11 @@ class RestClient(object):
             return
         
         self._active = True
-        self._pool = Pool(n)
-        self._pool.apply_async(self._run)
+        queryCount = max(n - 1, 1)
+        self._pool = Pool(queryCount + 1)
+        self._pool.apply_async(self._runTrading)
+        for i in range(queryCount):
+            self._pool.apply_async(self._run)
     
     #----------------------------------------------------------------------
     def stop(self):
@@ -121,6 +201,7 @@ class RestClient(object):
         如果只是要确保所有的请求都处理完，直接调用join即可。
         :return:
         """
+        self._tradingQueue.join()
         self._queue.join()
     
     #----------------------------------------------------------------------
@@ -133,7 +214,8 @@ class RestClient(object):
                    headers=None,    # type: dict
                    onFailed=None,   # type: Callable[[int, Request], Any]
                    onError=None,    # type: Callable[[type, Exception, traceback, Request], Any]
-                   extra=None       # type: Any
+                   extra=None,      # type: Any
+                   priority=None    # type: int
                    ):               # type: (...)->Request
         """
         发送一个请求
@@ -146,6 +228,7 @@ class RestClient(object):
         :param onFailed: 请求失败后的回调(状态吗不为2xx时认为请求失败)（如果指定该值，默认的onFailed将不会被调用） type: (code, dict, Request)
         :param onError: 请求出现Python错误后的回调（如果指定该值，默认的onError将不会被调用） type: (etype, evalue, tb, Request)
         :param extra: 返回值的extra字段会被设置为这个值。当然，你也可以在函数调用之后再设置这个字段。
+        :param priority: 请求优先级，默认GET为PRIORITY_QUERY，其余为PRIORITY_TRADING，PRIORITY_TRADING的请求按提交顺序发出
         :return: Request
         """
 
@@ -153,25 +236,115 @@ class RestClient(object):
         request.extra = extra
         request.onFailed = onFailed
         request.onError = onError
-        self._queue.put(request)
+        if priority is None:
+            priority = self.getPriority(request)
+        request.priority = priority
+        request.bucket = self.getBucket(request)
+        request.addTime = default_timer()
+        if priority == PRIORITY_TRADING:
+            self._tradingQueue.put(request)
+        else:
+            self._queue.put((priority, next(self._count), request))
         return request
     
+    #----------------------------------------------------------------------
+    def getPriority(self, request):  # type: (Request)->int
+        """
+        请求的默认优先级：查询类的GET请求排在下单撤单之后
+        子类可以重载以按路径区分
+        """
+        if request.method.upper() == 'GET':
+            return PRIORITY_QUERY
+        return PRIORITY_TRADING
+    
+    #----------------------------------------------------------------------
+    def getBucket(self, request):  # type: (Request)->Optional[TokenBucket]
+        """查找请求对应的限速令牌桶，没有限速规则时返回None"""
+        method = request.method.upper()
+        for bucketMethod, pattern, bucket in self._buckets:
+            if bucketMethod == method and pattern.match(request.path):
+                return bucket
+        return None
+    
+    #----------------------------------------------------------------------
+    def _delay(self, item, wait):
+        """请求被限速，等待wait秒后重新排队"""
+        with self._delayedLock:
+            heapq.heappush(self._delayed, (default_timer() + wait,) + item)
+    
+    #----------------------------------------------------------------------
+    def _releaseDelayed(self):
+        """
+        把到期的延后查询请求放回队列，返回距离下一个到期请求的秒数
+        重新排队后仍按优先级竞争
+        """
+        with self._delayedLock:
+            now = default_timer()
+            while self._delayed and self._delayed[0][0] <= now:
+                item = heapq.heappop(self._delayed)[1:]
+                self._queue.put(item)
+                self._queue.task_done()  # 延后时没有标记完成，这里抵消重新put的计数
+            if self._delayed:
+                return self._delayed[0][0] - now
+        return 1
+    
+    #----------------------------------------------------------------------
+    def _runTrading(self):
+        """
+        交易通道的工作线程，按提交顺序逐个发出请求
+        被限速时原地等待令牌，不重新排队，以免打乱顺序
+        """
+        try:
+            session = self._createSession()
+            while self._active:
+                try:
+                    request = self._tradingQueue.get(timeout=1)
+                except Empty:
+                    continue
+
+                try:
+                    if request.bucket:
+                        wait = request.bucket.acquire()
+                        while wait:
+                            sleep(wait)
+                            wait = request.bucket.acquire()
+
+                    request.sendTime = default_timer()
+                    self._processRequest(request, session)
+                finally:
+                    self._tradingQueue.task_done()
+        except:
+            et, ev, tb = sys.exc_info()
+            with self._callbackLock:
+                self.onError(et, ev, tb, None)
+
     #----------------------------------------------------------------------
     def _run(self):
         try:
             session = self._createSession()
             while self._active:
+                timeout = min(self._releaseDelayed(), 1)
                 try:
-                    request = self._queue.get(timeout=1)
-                    try:
-                        self._processRequest(request, session)
-                    finally:
-                        self._queue.task_done()
+                    item = self._queue.get(timeout=timeout)
                 except Empty:
-                    pass
+                    continue
+                
+                request = item[-1]
+                if request.bucket:
+                    wait = request.bucket.acquire()
+                    if wait:
+                        self._delay(item, wait)
+                        continue
+                
+                request.sendTime = default_timer()
+                try:
+                    self._processRequest(request, session)
+                finally:
+                    self._queue.task_done()
         except:
             et, ev, tb = sys.exc_info()
-            self.onError(et, ev, tb, None)
+            with self._callbackLock:
+                self.onError(et, ev, tb, None)
     
     #----------------------------------------------------------------------
     def sign(self, request):  # type: (Request)->Request
@@ -246,22 +419,25 @@ class RestClient(object):
             httpStatusCode = response.status_code
             if httpStatusCode / 100 == 2:                               # 2xx都算成功，尽管交易所都用200
                 jsonBody = response.json()
-                request.callback(jsonBody, request)
+                with self._callbackLock:
+                    request.callback(jsonBody, request)
                 request.status = RequestStatus.success
             else:
                 request.status = RequestStatus.failed
                 
-                if request.onFailed:
-                    request.onFailed(httpStatusCode, request)
-                else:
-                    self.onFailed(httpStatusCode, request)
+                with self._callbackLock:
+                    if request.onFailed:
+                        request.onFailed(httpStatusCode, request)
+                    else:
+                        self.onFailed(httpStatusCode, request)
         except:
             request.status = RequestStatus.error
             t, v, tb = sys.exc_info()
-            if request.onError:
-                request.onError(t, v, tb, request)
-            else:
-                self.onError(t, v, tb, request)
+            with self._callbackLock:
+                if request.onError:
+                    request.onError(t, v, tb, request)
+                else:
+                    self.onError(t, v, tb, request)
 
     #----------------------------------------------------------------------
     def makeFullUrl(self, path):
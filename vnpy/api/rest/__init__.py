@@ -1 +1 @@
-from .RestClient import Request, RequestStatus, RestClient
+from .RestClient import Request, RequestStatus, RestClient, TokenBucket, PRIORITY_TRADING, PRIORITY_QUERY
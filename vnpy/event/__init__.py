@@ -1,3 +1,3 @@
 # encoding: UTF-8
 
-from .eventEngine import EventEngine, EventEngine2, Event
\ No newline at end of file
+from .eventEngine import EventEngine, EventEngine2, ShardedEventEngine, Event, EventQueue, LANE_TRADING, LANE_MARKET, LANE_LOW
\ No newline at end of file
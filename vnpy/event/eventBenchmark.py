@@ -0,0 +1,156 @@
+# encoding: UTF-8
+
+'''
+EventEngine2事件处理吞吐量测试
+
+分别以原有的Queue.get逐个处理方式（QueueEventEngine，改动前EventEngine2的事件循环）、
+EventQueue逐个处理（batchSize=1）和批量处理的方式，测试注册1、10、50个处理函数时
+每秒能够处理的事件数量。事件由另一个线程持续put，模拟行情推送。
+ratio为批量处理相对于原有Queue.get方式的吞吐量倍数。
+
+运行：python -m vnpy.event.eventBenchmark
+'''
+
+from __future__ import print_function
+
+from collections import defaultdict
+from queue import Queue, Empty
+from threading import Thread, Event as ThreadEvent
+from time import perf_counter, sleep
+
+from vnpy.event.eventEngine import EventEngine2, Event
+from vnpy.event.eventType import EVENT_TIMER
+
+
+EVENT_COUNT = 200000
+EVENT_TYPE = 'eTick.'
+
+
+########################################################################
+class QueueEventEngine(object):
+    """改动前EventEngine2的事件循环：Queue.get逐个取出事件处理，作为对比基准"""
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.__queue = Queue()
+        self.__active = False
+        self.__thread = Thread(target = self.__run)
+        self.__timer = Thread(target = self.__runTimer)
+        self.__timerActive = False
+        self.__timerSleep = 1
+        self.__handlers = defaultdict(list)
+        self.__generalHandlers = []
+
+    #----------------------------------------------------------------------
+    def __run(self):
+        """引擎运行"""
+        while self.__active == True:
+            try:
+                event = self.__queue.get(block = True, timeout = 1)  # 获取事件的阻塞时间设为1秒
+                self.__process(event)
+            except Empty:
+                pass
+
+    #----------------------------------------------------------------------
+    def __process(self, event):
+        """处理事件"""
+        if event.type_ in self.__handlers:
+            [handler(event) for handler in self.__handlers[event.type_]]
+
+        if self.__generalHandlers:
+            [handler(event) for handler in self.__generalHandlers]
+
+    #----------------------------------------------------------------------
+    def __runTimer(self):
+        """运行在计时器线程中的循环函数"""
+        while self.__timerActive:
+            self.put(Event(type_=EVENT_TIMER))
+            sleep(self.__timerSleep)
+
+    #----------------------------------------------------------------------
+    def start(self, timer=True):
+        """引擎启动"""
+        self.__active = True
+        self.__thread.start()
+        if timer:
+            self.__timerActive = True
+            self.__timer.start()
+
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止引擎"""
+        self.__active = False
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
+        self.__thread.join()
+
+    #----------------------------------------------------------------------
+    def register(self, type_, handler):
+        """注册事件处理函数监听"""
+        handlerList = self.__handlers[type_]
+        if handler not in handlerList:
+            handlerList.append(handler)
+
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """向事件队列中存入事件"""
+        self.__queue.put(event)
+
+
+#----------------------------------------------------------------------
+def run(handlerCount, batchSize, eventCount=EVENT_COUNT):
+    """测试一次，返回每秒处理的事件数量，batchSize为None时测试QueueEventEngine"""
+    if batchSize is None:
+        ee = QueueEventEngine()
+    else:
+        ee = EventEngine2()
+        ee.setBatchSize(batchSize)
+    
+    finished = ThreadEvent()
+    counter = [0]
+    
+    def makeHandler():
+        def handler(event):
+            pass
+        return handler
+    
+    for i in range(handlerCount - 1):
+        ee.register(EVENT_TYPE, makeHandler())
+    
+    def lastHandler(event):
+        counter[0] += 1
+        if counter[0] == eventCount:
+            finished.set()
+    ee.register(EVENT_TYPE, lastHandler)
+    
+    def produce():
+        for i in range(eventCount):
+            ee.put(Event(EVENT_TYPE))
+    
+    ee.start(timer=True)
+    start = perf_counter()
+    producer = Thread(target=produce)
+    producer.start()
+    finished.wait()
+    cost = perf_counter() - start
+    
+    producer.join()
+    ee.stop()
+    return eventCount / cost
+
+
+#----------------------------------------------------------------------
+def main():
+    """运行测试"""
+    print(u'%8s %16s %16s %16s %8s' % ('handlers', 'Queue.get ev/s', 'batch=1 ev/s', 'batch=50 ev/s', 'ratio'))
+    for handlerCount in (1, 10, 50):
+        baseline = run(handlerCount, None)
+        single = run(handlerCount, 1)
+        batch = run(handlerCount, 50)
+        print(u'%8d %16.0f %16.0f %16.0f %8.2f' % (handlerCount, baseline, single, batch, batch / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,195 @@
 # encoding: UTF-8
 
 # 系统模块
-from queue import Queue, Empty
-from threading import Thread
-from time import sleep
-from collections import defaultdict
+from queue import Empty
+from threading import Thread, Condition, Lock
+from time import sleep, perf_counter
+from collections import defaultdict, deque
 
 # 第三方模块
 from qtpy.QtCore import QTimer
 
 # 自己开发的模块
 from .eventType import *
+from .eventStats import EventStats
+
+
+# 事件通道，数值越小优先级越高
+LANE_TRADING = 0    # 委托、成交、持仓、资金等交易事件
+LANE_MARKET = 1     # 行情数据，以及未指定通道的事件
+LANE_LOW = 2        # 日志、计时器、界面刷新
+
+# 事件类型前缀对应的通道
+DEFAULT_LANES = {
+    'eOrder.': LANE_TRADING,
+    'eTrade.': LANE_TRADING,
+    'ePosition.': LANE_TRADING,
+    'eAccount.': LANE_TRADING,
+    'eContract.': LANE_TRADING,
+    'eError.': LANE_TRADING,
+    'eTick.': LANE_MARKET,
+    'eLog': LANE_LOW,
+    'eTimer': LANE_LOW,
+    'eCtaLog': LANE_LOW,
+    'eCtaStrategy.': LANE_LOW,
+}
+
+
+#----------------------------------------------------------------------
+def getBaseType(type_):
+    """基础事件类型，即事件类型中第一个.及之前的部分，没有.时为事件类型本身"""
+    return type_[:type_.find('.') + 1] or type_
+
+
+########################################################################
+class EventQueue(object):
+    """
+    分通道的事件队列
+    交易事件、行情事件、日志和计时器事件分别进入不同的通道，取出时严格按照通道优先级，
+    同一通道内先进先出。行情刷屏时，成交回报最多只需要等待正在处理的事件完成。
+    
+    可选的行情合并模式：同一(事件类型, vtSymbol)的行情在队列中只保留最新的一个，
+    新行情替换尚未处理的旧行情并沿用旧行情的排队位置。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.__lanes = [deque() for i in range(LANE_LOW + 1)]
+        self.__condition = Condition()
+        self.__size = 0
+        
+        self.__laneDict = dict(DEFAULT_LANES)   # 事件类型前缀对应的通道
+        self.__laneCache = {}                   # 基础事件类型对应的通道缓存
+        self.__detailBases = set()              # 配置了更细前缀的基础事件类型，不缓存
+        self.__priorityActive = True            # 关闭后所有事件进入同一个通道
+        
+        # 行情合并相关
+        self.__conflateTypes = ()       # 需要合并的事件类型前缀，为空时不合并
+        self.__latestDict = {}          # key为(事件类型, vtSymbol)，value为排队中的最新事件
+        self.conflatedCount = 0         # 被新行情替换掉的行情数量
+
+    #----------------------------------------------------------------------
+    def qsize(self):
+        """队列中的事件数量"""
+        return self.__size
+    
+    #----------------------------------------------------------------------
+    def getLane(self, type_):
+        """
+        获取事件类型对应的通道
+        缓存以基础事件类型（第一个.及之前的部分，如eOrder.）为key，
+        委托号、账户等后缀各不相同的事件类型不会使缓存无限增长
+        """
+        if not type_:
+            return LANE_MARKET
+        
+        base = getBaseType(type_)
+        try:
+            return self.__laneCache[base]
+        except KeyError:
+            lane = LANE_MARKET
+            if self.__priorityActive:
+                for prefix, l in self.__laneDict.items():
+                    if type_.startswith(prefix):
+                        lane = l
+                        break
+            if base not in self.__detailBases:
+                self.__laneCache[base] = lane
+            return lane
+    
+    #----------------------------------------------------------------------
+    def setLane(self, typePrefix, lane):
+        """设置事件类型前缀对应的通道"""
+        self.__laneDict[typePrefix] = lane
+        self.__detailBases = set(getBaseType(prefix) for prefix in self.__laneDict
+                                 if getBaseType(prefix) != prefix)
+        self.__laneCache = {}
+    
+    #----------------------------------------------------------------------
+    def setPriority(self, active=True):
+        """设置是否按通道优先级处理事件，关闭后所有事件先进先出"""
+        self.__priorityActive = active
+        self.__laneCache = {}
+    
+    #----------------------------------------------------------------------
+    def setConflation(self, active=True, typePrefixes=('eTick.',)):
+        """
+        设置行情合并模式
+        typePrefixes：需要合并的事件类型前缀，默认为行情事件（vtEvent.EVENT_TICK）
+        """
+        if active:
+            self.__conflateTypes = tuple(typePrefixes)
+        else:
+            self.__conflateTypes = ()
+    
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """存入事件"""
+        item = event
+        lane = self.getLane(event.type_)
+        
+        with self.__condition:
+            if self.__conflateTypes and event.type_ and event.type_.startswith(self.__conflateTypes):
+                item = (event.type_, getattr(event.data, 'vtSymbol', None))
+                # 已有同一合约的行情在排队，直接替换
+                if item in self.__latestDict:
+                    self.__latestDict[item] = event
+                    self.conflatedCount += 1
+                    return
+                self.__latestDict[item] = event
+            
+            self.__lanes[lane].append(item)
+            self.__size += 1
+            self.__condition.notify()
+    
+    #----------------------------------------------------------------------
+    def get(self, timeout=None):
+        """取出优先级最高的事件，超时则抛出Empty"""
+        with self.__condition:
+            if not self.__size and not self.__condition.wait_for(self.qsize, timeout):
+                raise Empty
+            
+            for lane in self.__lanes:
+                if lane:
+                    item = lane.popleft()
+                    break
+            self.__size -= 1
+            
+            # 合并模式下队列中保存的是行情的key，取出此时最新的行情
+            if isinstance(item, tuple):
+                return self.__latestDict.pop(item)
+            return item
+    
+    #----------------------------------------------------------------------
+    def pending(self, lane):
+        """某个通道中排队的事件数量"""
+        return len(self.__lanes[lane])
+    
+    #----------------------------------------------------------------------
+    def getBatch(self, maxCount, timeout=None, maxLane=LANE_LOW):
+        """
+        一次取出最多maxCount个事件，按通道优先级排列，超时则抛出Empty
+        只需获取一次锁，减少逐个取出事件的开销
+        maxLane：只从优先级不低于该通道的通道中取出
+        """
+        with self.__condition:
+            if not self.__size and not self.__condition.wait_for(self.qsize, timeout):
+                raise Empty
+            
+            eventList = []
+            for lane in self.__lanes[:maxLane + 1]:
+                while lane and len(eventList) < maxCount:
+                    item = lane.popleft()
+                    if isinstance(item, tuple):
+                        item = self.__latestDict.pop(item)
+                    eventList.append(item)
+                
+                if len(eventList) >= maxCount:
+                    break
+            
+            self.__size -= len(eventList)
+            return eventList
 
 
 ########################################################################
@@ -38,6 +217,9 @@ class EventEngine(object):
     unregister：公共方法，向引擎中注销监听函数
     put：公共方法，向事件队列中存入新的事件
     
+    事件按类型进入不同优先级的通道（见EventQueue），交易事件总是先于行情、
+    行情总是先于日志和计时器事件被处理，可以通过setLane调整或setPriority关闭。
+    
     事件监听函数必须定义为输入参数仅为一个event对象，即：
     
     函数
@@ -54,7 +236,7 @@ class EventEngine(object):
     def __init__(self):
         """初始化事件引擎"""
         # 事件队列
-        self.__queue = Queue()
+        self.__queue = EventQueue()
         
         # 事件引擎开关
         self.__active = False
@@ -78,7 +260,7 @@ class EventEngine(object):
         """引擎运行"""
         while self.__active == True:
             try:
-                event = self.__queue.get(block = True, timeout = 1)  # 获取事件的阻塞时间设为1秒
+                event = self.__queue.get(timeout = 1)  # 获取事件的阻塞时间设为1秒
                 self.__process(event)
             except Empty:
                 pass
@@ -164,6 +346,21 @@ class EventEngine(object):
     def put(self, event):
         """向事件队列中存入事件"""
         self.__queue.put(event)
+    
+    #----------------------------------------------------------------------
+    def setConflation(self, active=True, typePrefixes=('eTick.',)):
+        """设置行情合并模式，参见EventQueue.setConflation"""
+        self.__queue.setConflation(active, typePrefixes)
+    
+    #----------------------------------------------------------------------
+    def setLane(self, typePrefix, lane):
+        """设置事件类型前缀对应的通道"""
+        self.__queue.setLane(typePrefix, lane)
+    
+    #----------------------------------------------------------------------
+    def setPriority(self, active=True):
+        """设置是否按通道优先级处理事件"""
+        self.__queue.setPriority(active)
         
     #----------------------------------------------------------------------
     def registerGeneralHandler(self, handler):
@@ -182,14 +379,21 @@ class EventEngine(object):
 ########################################################################
 class EventEngine2(object):
     """
-    计时器使用python线程的事件驱动引擎        
+    计时器使用python线程的事件驱动引擎
+    
+    事件队列和EventEngine一样按通道优先级处理，并支持可选的行情合并模式
+    （setConflation）：同一(事件类型, vtSymbol)的行情在队列中只保留最新的一个，
+    委托、成交、持仓等其他事件不受影响。
+    
+    可选的运行统计（setStats）：记录每个处理函数的耗时、队列深度和事件等待时间，
+    通过getStats获取快照，或定时写入本地文件。
     """
 
     #----------------------------------------------------------------------
     def __init__(self):
         """初始化事件引擎"""
         # 事件队列
-        self.__queue = Queue()
+        self.__queue = EventQueue()
         
         # 事件引擎开关
         self.__active = False
@@ -209,19 +413,38 @@ class EventEngine2(object):
         # __generalHandlers是一个列表，用来保存通用回调函数（所有事件均调用）
         self.__generalHandlers = []        
         
+        # 运行统计，为None时不统计
+        self.__stats = None
+        
+        # 每次从队列中最多取出的事件数量
+        # 取出的事件处理完之前，新到的高优先级事件需要等待，因此不宜设置过大
+        self.__batchSize = 50
+        
     #----------------------------------------------------------------------
     def __run(self):
         """引擎运行"""
         while self.__active == True:
             try:
-                event = self.__queue.get(block = True, timeout = 1)  # 获取事件的阻塞时间设为1秒
-                self.__process(event)
+                eventList = self.__queue.getBatch(self.__batchSize, timeout = 1)  # 获取事件的阻塞时间设为1秒
             except Empty:
-                pass
+                continue
+            
+            for event in eventList:
+                # 处理批量中的非交易事件时有交易事件到达，先处理交易事件
+                # （批量中的交易事件已排在最前，不能被后到的交易事件插队）
+                if self.__queue.pending(LANE_TRADING) and self.__queue.getLane(event.type_) != LANE_TRADING:
+                    for e in self.__queue.getBatch(self.__batchSize, 0, LANE_TRADING):
+                        self.__process(e)
+                
+                self.__process(event)
             
     #----------------------------------------------------------------------
     def __process(self, event):
         """处理事件"""
+        if self.__stats:
+            self.__processWithStats(event)
+            return
+        
         # 检查是否存在对该事件进行监听的处理函数
         if event.type_ in self.__handlers:
             # 若存在，则按顺序将事件传递给处理函数执行
@@ -234,6 +457,18 @@ class EventEngine2(object):
         # 调用通用处理函数进行处理
         if self.__generalHandlers:
             [handler(event) for handler in self.__generalHandlers]        
+    
+    #----------------------------------------------------------------------
+    def __processWithStats(self, event):
+        """处理事件并记录统计"""
+        stats = self.__stats
+        stats.onDispatch(event, self.__queue.qsize(), perf_counter())
+        
+        handlerList = self.__handlers.get(event.type_, []) + self.__generalHandlers
+        for handler in handlerList:
+            start = perf_counter()
+            handler(event)
+            stats.onHandler(event.type_, handler, perf_counter() - start)
                
     #----------------------------------------------------------------------
     def __runTimer(self):
@@ -277,6 +512,10 @@ class EventEngine2(object):
         
         # 等待事件处理线程退出
         self.__thread.join()
+        
+        # 停止统计文件写入
+        if self.__stats:
+            self.__stats.stopDump()
             
     #----------------------------------------------------------------------
     def register(self, type_, handler):
@@ -305,7 +544,61 @@ class EventEngine2(object):
     #----------------------------------------------------------------------
     def put(self, event):
         """向事件队列中存入事件"""
+        if self.__stats:
+            event.putTime = perf_counter()
         self.__queue.put(event)
+    
+    #----------------------------------------------------------------------
+    def setConflation(self, active=True, typePrefixes=('eTick.',)):
+        """设置行情合并模式，参见EventQueue.setConflation"""
+        self.__queue.setConflation(active, typePrefixes)
+    
+    #----------------------------------------------------------------------
+    def setLane(self, typePrefix, lane):
+        """设置事件类型前缀对应的通道"""
+        self.__queue.setLane(typePrefix, lane)
+    
+    #----------------------------------------------------------------------
+    def setPriority(self, active=True):
+        """设置是否按通道优先级处理事件"""
+        self.__queue.setPriority(active)
+    
+    #----------------------------------------------------------------------
+    def setBatchSize(self, batchSize):
+        """设置每次从队列中最多取出的事件数量，为1时逐个处理"""
+        self.__batchSize = max(1, int(batchSize))
+    
+    #----------------------------------------------------------------------
+    def setStats(self, active=True, fileName='', interval=60, sampleSize=1000):
+        """
+        设置运行统计
+        fileName：不为空时每隔interval秒将统计快照以json行追加写入该文件
+        sampleSize：计算百分位数使用的最近采样数量
+        """
+        if self.__stats:
+            self.__stats.stopDump()
+        
+        if not active:
+            self.__stats = None
+            return
+        
+        stats = EventStats(sampleSize)
+        if fileName:
+            stats.startDump(fileName, interval)
+        self.__stats = stats
+    
+    #----------------------------------------------------------------------
+    def getStats(self):
+        """获取运行统计快照，未开启统计时返回空字典"""
+        if not self.__stats:
+            return {}
+        return self.__stats.getSnapshot()
+    
+    #----------------------------------------------------------------------
+    @property
+    def conflatedCount(self):
+        """被合并的行情数量"""
+        return self.__queue.conflatedCount
 
     #----------------------------------------------------------------------
     def registerGeneralHandler(self, handler):
@@ -321,14 +614,324 @@ class EventEngine2(object):
 
 
 ########################################################################
-class Event:
-    """事件对象"""
+class ShardedEventEngine(object):
+    """
+    按合约分片的多线程事件驱动引擎
+    
+    事件按数据的vtSymbol分配到N个工作线程，每个线程有独立的事件队列（EventQueue），
+    同一合约的行情、委托、成交、持仓事件总是由同一个线程按顺序处理，一个策略处理缓慢
+    不会拖慢其他线程上的合约。
+    
+    交易多个合约的策略需要通过groupSymbols将其合约分到同一个线程，保证策略的回调
+    不会被并发调用（CtaEngine载入策略时会自动调用）。
+    
+    没有vtSymbol的事件（资金、错误、日志、计时器等）由单独的控制线程处理，控制线程处理事件时
+    独占引擎：等待各分片线程处理完手上的一批事件后才开始，处理期间分片线程暂停取出新事件，
+    因此注册在这些事件上的处理函数不会与任何其他处理函数并发执行。
+    
+    注册函数的接口与EventEngine2一致。
+    """
 
     #----------------------------------------------------------------------
-    def __init__(self, type_=None):
+    def __init__(self, shardCount=4):
+        """初始化事件引擎"""
+        self.shardCount = shardCount
+        
+        # 每个分片的事件队列和处理线程
+        self.__queueList = [EventQueue() for i in range(shardCount)]
+        self.__threadList = [Thread(target=self.__run, args=(queue,)) for queue in self.__queueList]
+        
+        # 控制线程，处理没有vtSymbol的事件
+        self.__controlQueue = EventQueue()
+        self.__threadList.append(Thread(target=self.__run, args=(self.__controlQueue, True)))
+        self.__allQueues = self.__queueList + [self.__controlQueue]
+        
+        # 分片线程与控制线程的同步
+        self.__gate = Condition()
+        self.__busyShards = 0           # 正在处理事件的分片线程数量
+        self.__controlPending = False   # 控制线程等待或正在处理事件
+        
+        # 事件引擎开关
+        self.__active = False
+        
+        # 计时器，用于触发计时器事件
+        self.__timer = Thread(target = self.__runTimer)
+        self.__timerActive = False                      # 计时器工作状态
+        self.__timerSleep = 1                           # 计时器触发间隔（默认1秒）
+        
+        # 处理函数
+        self.__handlers = defaultdict(list)
+        self.__generalHandlers = []
+        
+        # 合约分片关系
+        self.__shardDict = {}           # key为vtSymbol，value为分片编号
+        self.__groupDict = {}           # key为vtSymbol，value为需要在同一分片的合约集合
+        self.__shardLoad = [0] * shardCount  # 每个分片的合约数量
+        self.__routeLock = Lock()
+        
+        self.__batchSize = 50
+    
+    #----------------------------------------------------------------------
+    def __run(self, queue, control=False):
+        """分片线程和控制线程运行"""
+        while self.__active == True:
+            try:
+                eventList = queue.getBatch(self.__batchSize, timeout = 1)
+            except Empty:
+                continue
+            
+            if control:
+                self.__enterControl()
+            else:
+                self.__enterShard()
+            
+            try:
+                for event in eventList:
+                    if queue.pending(LANE_TRADING) and queue.getLane(event.type_) != LANE_TRADING:
+                        for e in queue.getBatch(self.__batchSize, 0, LANE_TRADING):
+                            self.__process(e)
+                    
+                    self.__process(event)
+            finally:
+                if control:
+                    self.__leaveControl()
+                else:
+                    self.__leaveShard()
+    
+    #----------------------------------------------------------------------
+    def __enterShard(self):
+        """分片线程开始处理一批事件，控制线程等待或处理中时先等待其完成"""
+        with self.__gate:
+            while self.__controlPending:
+                self.__gate.wait()
+            self.__busyShards += 1
+    
+    #----------------------------------------------------------------------
+    def __leaveShard(self):
+        """分片线程处理完一批事件"""
+        with self.__gate:
+            self.__busyShards -= 1
+            if not self.__busyShards:
+                self.__gate.notify_all()
+    
+    #----------------------------------------------------------------------
+    def __enterControl(self):
+        """控制线程开始处理一批事件，阻止分片线程取出新事件并等待正在处理的分片线程完成"""
+        with self.__gate:
+            self.__controlPending = True
+            while self.__busyShards:
+                self.__gate.wait()
+    
+    #----------------------------------------------------------------------
+    def __leaveControl(self):
+        """控制线程处理完一批事件，恢复分片线程"""
+        with self.__gate:
+            self.__controlPending = False
+            self.__gate.notify_all()
+    
+    #----------------------------------------------------------------------
+    def __process(self, event):
+        """处理事件"""
+        if event.type_ in self.__handlers:
+            [handler(event) for handler in self.__handlers[event.type_]]
+        
+        if self.__generalHandlers:
+            [handler(event) for handler in self.__generalHandlers]
+    
+    #----------------------------------------------------------------------
+    def __runTimer(self):
+        """运行在计时器线程中的循环函数"""
+        while self.__timerActive:
+            event = Event(type_=EVENT_TIMER)
+            self.put(event)
+            sleep(self.__timerSleep)
+    
+    #----------------------------------------------------------------------
+    def __assign(self, vtSymbol):
+        """为首次出现的合约分配分片"""
+        with self.__routeLock:
+            if vtSymbol not in self.__shardDict:
+                shard = self.__shardLoad.index(min(self.__shardLoad))
+                self.__shardDict[vtSymbol] = shard
+                self.__shardLoad[shard] += 1
+            return self.__shardDict[vtSymbol]
+    
+    #----------------------------------------------------------------------
+    def getShard(self, vtSymbol):
+        """获取合约所在的分片编号，没有合约时返回None（由控制线程处理）"""
+        if not vtSymbol:
+            return None
+        
+        try:
+            return self.__shardDict[vtSymbol]
+        except KeyError:
+            return self.__assign(vtSymbol)
+    
+    #----------------------------------------------------------------------
+    def groupSymbols(self, symbols):
+        """
+        将一组合约分配到同一个分片，与已有的分组重叠时合并
+        需要在这些合约的行情推送之前调用，否则已在其他分片排队的事件可能乱序
+        """
+        symbols = [s for s in symbols if s]
+        if not symbols:
+            return
+        
+        with self.__routeLock:
+            group = set(symbols)
+            for vtSymbol in symbols:
+                group |= self.__groupDict.get(vtSymbol, set())
+            
+            # 优先沿用已分配的分片，否则选择合约最少的分片
+            shardList = [self.__shardDict[s] for s in symbols if s in self.__shardDict]
+            if shardList:
+                shard = shardList[0]
+            else:
+                shard = self.__shardLoad.index(min(self.__shardLoad))
+            
+            for vtSymbol in group:
+                old = self.__shardDict.get(vtSymbol)
+                if old is not None:
+                    self.__shardLoad[old] -= 1
+                self.__shardDict[vtSymbol] = shard
+                self.__shardLoad[shard] += 1
+                self.__groupDict[vtSymbol] = group
+    
+    #----------------------------------------------------------------------
+    def start(self, timer=True):
+        """
+        引擎启动
+        timer：是否要启动计时器
+        """
+        self.__active = True
+        
+        for thread in self.__threadList:
+            thread.start()
+        
+        if timer:
+            self.__timerActive = True
+            self.__timer.start()
+    
+    #----------------------------------------------------------------------
+    def stop(self):
+        """停止引擎"""
+        self.__active = False
+        
+        if self.__timerActive:
+            self.__timerActive = False
+            self.__timer.join()
+        
+        for thread in self.__threadList:
+            thread.join()
+    
+    #----------------------------------------------------------------------
+    def register(self, type_, handler):
+        """注册事件处理函数监听"""
+        handlerList = self.__handlers[type_]
+        if handler not in handlerList:
+            handlerList.append(handler)
+    
+    #----------------------------------------------------------------------
+    def unregister(self, type_, handler):
+        """注销事件处理函数监听"""
+        handlerList = self.__handlers[type_]
+        if handler in handlerList:
+            handlerList.remove(handler)
+        if not handlerList:
+            del self.__handlers[type_]
+    
+    #----------------------------------------------------------------------
+    def put(self, event):
+        """向合约对应分片的事件队列中存入事件，没有合约的事件存入控制线程的队列"""
+        vtSymbol = getattr(event.data, 'vtSymbol', None)
+        if vtSymbol:
+            self.__queueList[self.getShard(vtSymbol)].put(event)
+        else:
+            self.__controlQueue.put(event)
+    
+    #----------------------------------------------------------------------
+    def setConflation(self, active=True, typePrefixes=('eTick.',)):
+        """设置行情合并模式，参见EventQueue.setConflation"""
+        for queue in self.__allQueues:
+            queue.setConflation(active, typePrefixes)
+    
+    #----------------------------------------------------------------------
+    def setLane(self, typePrefix, lane):
+        """设置事件类型前缀对应的通道"""
+        for queue in self.__allQueues:
+            queue.setLane(typePrefix, lane)
+    
+    #----------------------------------------------------------------------
+    def setPriority(self, active=True):
+        """设置是否按通道优先级处理事件"""
+        for queue in self.__allQueues:
+            queue.setPriority(active)
+    
+    #----------------------------------------------------------------------
+    def setBatchSize(self, batchSize):
+        """设置每次从队列中最多取出的事件数量"""
+        self.__batchSize = max(1, int(batchSize))
+    
+    #----------------------------------------------------------------------
+    @property
+    def conflatedCount(self):
+        """被合并的行情数量"""
+        return sum(queue.conflatedCount for queue in self.__allQueues)
+    
+    #----------------------------------------------------------------------
+    def registerGeneralHandler(self, handler):
+        """注册通用事件处理函数监听"""
+        if handler not in self.__generalHandlers:
+            self.__generalHandlers.append(handler)
+    
+    #----------------------------------------------------------------------
+    def unregisterGeneralHandler(self, handler):
+        """注销通用事件处理函数监听"""
+        if handler in self.__generalHandlers:
+            self.__generalHandlers.remove(handler)
+
+
+########################################################################
+class Event(object):
+    """
+    事件对象
+    
+    事件数据可以直接在创建时传入：Event(type_, data)，通过event.data读取，
+    不再为每个事件创建字典。event.dict_['data']的写法仍然可用，
+    dict_在第一次访问时才创建，并与data保持一致。
+    """
+    __slots__ = ('type_', '_data', '_dict', 'putTime')
+
+    #----------------------------------------------------------------------
+    def __init__(self, type_=None, data=None):
         """Constructor"""
         self.type_ = type_      # 事件类型
-        self.dict_ = {}         # 字典用于保存具体的事件数据
+        self._data = data       # 事件数据
+        self._dict = None       # 字典用于保存具体的事件数据，按需创建
+    
+    #----------------------------------------------------------------------
+    @property
+    def data(self):
+        """事件数据"""
+        if self._dict is None:
+            return self._data
+        return self._dict.get('data')
+    
+    #----------------------------------------------------------------------
+    @data.setter
+    def data(self, data):
+        """设置事件数据"""
+        self._data = data
+        if self._dict is not None:
+            self._dict['data'] = data
+    
+    #----------------------------------------------------------------------
+    @property
+    def dict_(self):
+        """兼容原有写法的事件数据字典"""
+        if self._dict is None:
+            self._dict = {} if self._data is None else {'data': self._data}
+        return self._dict
 
 
 #----------------------------------------------------------------------
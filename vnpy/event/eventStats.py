@@ -0,0 +1,164 @@
+# encoding: UTF-8
+
+'''
+事件引擎的运行统计，用于定位拖慢事件处理线程的监听函数
+
+统计内容：
+1. 每个事件类型下每个处理函数的调用次数、累计耗时、耗时的p50/p99/最大值
+2. 事件处理时的队列深度
+3. 每个事件类型从put到开始处理的等待时间（事件年龄）
+
+百分位数基于最近sampleSize次采样计算，时间单位均为秒。
+'''
+
+import json
+from collections import deque
+from datetime import datetime
+from threading import Thread, Event as ThreadEvent
+
+
+#----------------------------------------------------------------------
+def getHandlerName(handler):
+    """获取处理函数的名称"""
+    name = getattr(handler, '__qualname__', None) or getattr(handler, '__name__', None)
+    return name or repr(handler)
+
+
+#----------------------------------------------------------------------
+def summarize(samples):
+    """计算采样的p50/p99/最大值"""
+    data = sorted(samples)
+    n = len(data)
+    if not n:
+        return {'p50': 0, 'p99': 0, 'max': 0}
+    return {
+        'p50': data[int(n * 0.5)],
+        'p99': data[min(n - 1, int(n * 0.99))],
+        'max': data[-1]
+    }
+
+
+########################################################################
+class Sample(object):
+    """单项统计"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, sampleSize):
+        """Constructor"""
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.samples = deque(maxlen=sampleSize)
+
+    #----------------------------------------------------------------------
+    def add(self, value):
+        """添加采样"""
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        self.samples.append(value)
+
+    #----------------------------------------------------------------------
+    def getData(self):
+        """获取统计结果"""
+        d = summarize(list(self.samples))
+        d['count'] = self.count
+        d['total'] = self.total
+        d['max'] = self.max     # 历史最大值，而非采样窗口内的最大值
+        return d
+
+
+########################################################################
+class EventStats(object):
+    """事件引擎运行统计"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, sampleSize=1000):
+        """Constructor"""
+        self.sampleSize = sampleSize
+        self.startTime = datetime.now()
+
+        self.handlerDict = {}       # key为(事件类型, 处理函数)
+        self.ageDict = {}           # key为事件类型
+        self.depth = Sample(sampleSize)
+
+        self.dumpThread = None
+        self.dumpStop = ThreadEvent()
+
+    #----------------------------------------------------------------------
+    def onDispatch(self, event, queueDepth, now):
+        """事件开始处理时记录队列深度和事件年龄"""
+        self.depth.add(queueDepth)
+
+        putTime = getattr(event, 'putTime', None)
+        if putTime is None:
+            return
+
+        try:
+            sample = self.ageDict[event.type_]
+        except KeyError:
+            sample = self.ageDict[event.type_] = Sample(self.sampleSize)
+        sample.add(now - putTime)
+
+    #----------------------------------------------------------------------
+    def onHandler(self, type_, handler, cost):
+        """记录处理函数耗时"""
+        key = (type_, handler)
+        try:
+            sample = self.handlerDict[key]
+        except KeyError:
+            sample = self.handlerDict[key] = Sample(self.sampleSize)
+        sample.add(cost)
+
+    #----------------------------------------------------------------------
+    def getSnapshot(self):
+        """获取统计快照"""
+        handlers = {}
+        for (type_, handler), sample in list(self.handlerDict.items()):
+            handlers.setdefault(type_, {})[getHandlerName(handler)] = sample.getData()
+
+        age = {}
+        for type_, sample in list(self.ageDict.items()):
+            age[type_] = sample.getData()
+
+        depth = self.depth.getData()
+        depth['current'] = self.depth.samples[-1] if self.depth.samples else 0
+
+        return {
+            'datetime': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'startTime': self.startTime.strftime('%Y-%m-%d %H:%M:%S'),
+            'queueDepth': depth,
+            'eventAge': age,
+            'handlers': handlers
+        }
+
+    #----------------------------------------------------------------------
+    def dump(self, fileName):
+        """将统计快照以一行json追加到文件"""
+        with open(fileName, 'a') as f:
+            f.write(json.dumps(self.getSnapshot()) + '\n')
+
+    #----------------------------------------------------------------------
+    def startDump(self, fileName, interval=60):
+        """启动定时写入文件的线程，不经过事件引擎"""
+        self.stopDump()
+        self.dumpStop.clear()
+        self.dumpThread = Thread(target=self.runDump, args=(fileName, interval))
+        self.dumpThread.daemon = True
+        self.dumpThread.start()
+
+    #----------------------------------------------------------------------
+    def runDump(self, fileName, interval):
+        """定时写入文件"""
+        while not self.dumpStop.wait(interval):
+            self.dump(fileName)
+        self.dump(fileName)     # 停止时再写入一次
+
+    #----------------------------------------------------------------------
+    def stopDump(self):
+        """停止定时写入"""
+        if self.dumpThread:
+            self.dumpStop.set()
+            self.dumpThread.join()
+            self.dumpThread = None
@@ -3,15 +3,21 @@
 可以使用和实盘相同的代码进行回测。
 '''
 from datetime import datetime, timedelta
-from collections import OrderedDict,defaultdict
-from itertools import product
-import copy
+from collections import OrderedDict, defaultdict, deque
+from itertools import product, repeat
+from functools import partial
 import sys
 import os
+import pickle
+import json
+import csv
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from vnpy.trader.vtObject import VtTickData, VtBarData, VtLogData
+from vnpy.trader.vtObject import VtTickData, VtBarData, VtLogData, VtCompactTickData, VtCompactBarData
+from vnpy.trader.vtStore import DataStore
 from vnpy.trader.vtGateway import VtOrderData, VtTradeData
 from vnpy.trader.language import constant
 from vnpy.trader.app.ctaStrategy.ctaBase import *
@@ -59,6 +65,9 @@ class BacktestingEngine(object):
         self.contractInfo = {}      # 回测标的信息字典
 
         self.cachePath = os.path.join(os.path.expanduser("~"), "vnpy_data")       # 本地数据缓存地址
+        self.storePath = None       # 行情记录的本地文件存储地址
+        self.columnarMode = False   # 列式回放模式，数据保存为numpy数组，回放时复用数据对象
+        self.compactMode = False    # 使用__slots__数据类（VtCompactBarData/VtCompactTickData）保存历史数据
         self.logActive = False      # 回测日志开关
         self.logPath = os.path.join(os.getcwd(), "Backtest_Log")  # 回测日志自定义路径
 
@@ -70,6 +79,11 @@ class BacktestingEngine(object):
         self.limitOrderDict = OrderedDict()         # 限价单字典
         self.workingLimitOrderDict = OrderedDict()  # 活动限价单字典，用于进行撮合用
         
+        # 按合约索引的活动委托，key为vtSymbol，撮合时只取出价格落在行情范围内的委托
+        self.limitOrderBookDict = defaultdict(partial(OrderBook, True, isLimitOrderActive))
+        self.stopOrderBookDict = defaultdict(OrderBook)
+        self.newLimitOrderDict = defaultdict(list)  # 尚未推送未成交状态的新委托
+        
         self.tradeCount = 0             # 成交编号
         self.tradeDict = OrderedDict()  # 成交字典
         
@@ -83,7 +97,7 @@ class BacktestingEngine(object):
         self.annualDays = 240  # 年化的基数
         
         # 日线回测结果计算用
-        self.dailyResultDict = defaultdict(OrderedDict)
+        self.dailyCloseDict = defaultdict(OrderedDict)
     
     #------------------------------------------------
     # 通用功能
@@ -167,10 +181,34 @@ class BacktestingEngine(object):
     def setCachePath(self, path):
         self.cachePath = path
 
+    #----------------------------------------------------------------------
+    def setStorePath(self, path):
+        """设置行情记录的本地文件存储地址，载入数据时优先读取"""
+        self.storePath = path
+
+    #----------------------------------------------------------------------
+    def setColumnarMode(self, active=False):
+        """
+        设置是否使用列式数据回放
+        开启后历史数据以numpy数组保存，回放时每个品种复用同一个数据对象，
+        策略如需保存收到的bar/tick，请自行复制
+        """
+        self.columnarMode = active
+
+    #----------------------------------------------------------------------
+    def setCompactMode(self, active=False):
+        """
+        设置是否使用__slots__数据类保存历史数据，大幅减少内存占用
+        字段名不变，但策略不能在bar/tick上添加新的属性
+        """
+        self.compactMode = active
+
     #------------------------------------------------
     # 数据回放相关
     #------------------------------------------------
     def parseData(self, dataClass, dataDict):
+        if self.compactMode:
+            return dataClass.fromDict(dataDict)
         data = dataClass()
         data.__dict__.update(dataDict)
         return data
@@ -181,135 +219,290 @@ class BacktestingEngine(object):
         'symbol': 'tBTCUSD', 'time': '10:44:00.000000', 'volume': 12.18062789, 'vtSymbol': 'tBTCUSD:bitfinex'}
         """
     # ----------------------------------------------------------------------
-    def loadHistoryData(self, symbolList, startDate, endDate=None):
-        """载入历史数据:数据范围[start:end)"""
+    def loadHistoryFrames(self, symbolList, startDate, endDate=None):
+        """载入历史数据的DataFrame:数据范围[start:end), 返回{vtSymbol: [DataFrame]}"""
         if not endDate:
             endDate = datetime.strptime(self.END_OF_THE_WORLD, constant.DATETIME)
 
-        modeMap = {
-            self.BAR_MODE: "datetime", 
-            self.TICK_MODE: "date"
-            }
-
-        # 根据回测模式，确认要使用的数据类
-        if self.mode == self.BAR_MODE:
-            dataClass = VtBarData
-            datetime_list = get_minutes_list(start=startDate, end=endDate)
-            date_list = list(set([date.strftime(constant.DATE) for date in datetime_list]))
-            need_files = [f"{d}.hd5" for d in date_list]
-        else:
-            dataClass = VtTickData
-            datetime_list = [date.strftime(constant.DATE) for date in get_date_list(start=startDate, end=endDate)]
-            need_files = [f"{d}.hd5" for d in datetime_list]
-        need_files = list(set(need_files))
-
         start = startDate.strftime(constant.DATETIME)
         end = endDate.strftime(constant.DATETIME)
         self.output(f"准备载入数据：时间段:[{start} , {end})")
 
-        # 下载数据
-        dataList = []
-        df_cached = {}
-        # 优先从本地文件缓存读取数据
-        symbols_no_data = dict()  # 本地缓存没有的数据
-        
-        for symbol in self.strategy.symbolList:
-            # 如果存在缓存文件，则读取日期列表和bar数据，否则初始化df_cached和dates_cached
+        # 需要读取的缓存文件日期，未来的日期不会有数据
+        dayList = []
+        day = datetime(startDate.year, startDate.month, startDate.day)
+        lastDay = min(endDate, datetime.now() + timedelta(days=1))
+        while day < lastDay:
+            dayList.append(day.strftime(constant.DATE))
+            day += timedelta(days=1)
+
+        frames = defaultdict(list)
+        missingDict = {}        # 本地没有覆盖、需要从数据库查询的时间区间
+        manifestDict = {}
+
+        for symbol in symbolList:
             save_path = os.path.join(self.cachePath, self.mode, symbol.replace(":", "_"))
-            symbols_no_data[symbol] = datetime_list
-            df_cached[symbol] = {}
-            dt_list_acquired = []
-
-            for file_ in need_files:
-                hd5_file_path = f'{save_path}/{file_}'
-                if os.path.isfile(hd5_file_path):
-                    # 读取 hd5
-                    df_cached[symbol][file_] = pd.read_hdf(hd5_file_path)
-                    df_acquired = df_cached[symbol][file_][
-                        (df_cached[symbol][file_].datetime >= start) & (df_cached[symbol][file_].datetime < end)
-                        ]
-                    dataList += [self.parseData(dataClass, item) for item in df_acquired.to_dict("record")]
-                    dt_list_acquired += list(set(df_acquired[modeMap[self.mode]]))  # bar 回测按datetime, tick 回测按date
-
-            symbols_no_data[symbol] = list(set(dt_list_acquired) ^ (set(datetime_list)))
-            acq, need = len(dt_list_acquired), len(datetime_list)
-            self.output(f"{symbol}： 从本地缓存文件实取{acq}, 最大应取{need}, 还需从数据库取{need-acq}")
+            manifest = CacheManifest(save_path)
+            manifestDict[symbol] = manifest
+            coverList = []                  # 本次从行情记录读取的数据覆盖的区间
+            count = 0
+            fileCount = 0
+            emptyCount = 0
+
+            # 优先读取行情记录的本地文件，这些时段不再读取缓存文件中的数据
+            storeSpans = {}
+            if self.storePath:
+                df_store = DataStore(self.storePath).read(self.mode, symbol, startDate, endDate)
+                if df_store is not None:
+                    frames[symbol].append(df_store)
+                    count += len(df_store)
+                    for d, dt in df_store.datetime.groupby(df_store.datetime.dt.strftime(constant.DATE)):
+                        storeSpans[d] = (dt.min(), dt.max())
+                        coverList.append(self.getCoverSpan(d, dt))
+
+            # 根据清单决定要打开的缓存文件
+            for d in dayList:
+                hd5_file_path = os.path.join(save_path, f"{d}.hd5")
+                info = manifest.days.get(d)
+                if info is None:
+                    # 整天都在覆盖范围内却没有文件记录，说明当天没有数据（例如休市）
+                    dayStart = datetime.strptime(d, constant.DATE)
+                    if not manifest.getMissing(dayStart, dayStart + timedelta(days=1)):
+                        emptyCount += 1
+                        continue
+                    # 清单中没有记录的旧缓存文件
+                    if not os.path.isfile(hd5_file_path):
+                        continue
+                elif info["end"] < startDate or info["start"] >= endDate:
+                    continue
+
+                try:
+                    df_cached = pd.read_hdf(hd5_file_path)
+                except FileNotFoundError:
+                    # 文件已被删除，清除记录后从数据库重新获取
+                    manifest.removeDay(d)
+                    continue
+                fileCount += 1
+
+                # 旧缓存文件按内容推断覆盖范围
+                if info is None and len(df_cached) > 0:
+                    manifest.addRange(*self.getCoverSpan(d, df_cached.datetime))
+                    manifest.setDay(d, df_cached.datetime)
+
+                # 文件中已有的时段不再查询数据库，未完整覆盖的日期（如缓存时的当天）只补查文件之后的部分
+                if len(df_cached) > 0:
+                    coverList.append(self.getFileSpan(df_cached.datetime))
+
+                df_acquired = df_cached[(df_cached.datetime >= startDate) & (df_cached.datetime < endDate)]
+                if d in storeSpans:
+                    lo, hi = storeSpans[d]
+                    df_acquired = df_acquired[(df_acquired.datetime < lo) | (df_acquired.datetime > hi)]
+                if len(df_acquired) > 0:
+                    frames[symbol].append(df_acquired)
+                    count += len(df_acquired)
+
+            missingDict[symbol] = manifest.getMissing(startDate, endDate, coverList)
+            self.output(f"{symbol}： 读取缓存文件{fileCount}个, 跳过无数据的日期{emptyCount}个, "
+                        f"实取{count}, 还需从数据库查询{len(missingDict[symbol])}个时间段")
 
         # 如果没有完全从本地文件加载完数据, 则尝试从指定的mongodb下载数据, 并缓存到本地
         if self.dbURI:
             import pymongo
             self.dbClient = pymongo.MongoClient(self.dbURI)[self.dbName]
-            for symbol, need_datetimes in symbols_no_data.items():
-                if len(need_datetimes) > 0:  # 需要从数据库取数据
-                    if symbol in self.dbClient.collection_names():
-                        collection = self.dbClient[symbol]
-                        Cursor = collection.find({modeMap[self.mode]: {"$in": need_datetimes}})  # 按时间回测检索
-                        data_df = pd.DataFrame(list(Cursor))
-                        if data_df.size > 0:
-                            del data_df["_id"]
-                            # 筛选出需要的时间段
-                            dataList += [self.parseData(dataClass, item) for item in
-                                            data_df[(data_df.datetime >= start) & (data_df.datetime < end)].to_dict(
-                                                "record")]
-                            # 缓存到本地文件
-                            save_path = os.path.join(self.cachePath, self.mode, symbol.replace(":", "_"))
-                            if not os.path.isdir(save_path):
-                                os.makedirs(save_path)
-
-                            if self.mode == self.BAR_MODE:
-                                dates = [datetimes.strftime(constant.DATE) for datetimes in symbols_no_data[symbol]]
-                                symbols_no_data[symbol] = list(set(dates))
-                            for date in symbols_no_data[symbol]:
-                                update_df = data_df[data_df["date"] == date]
-                                if update_df.size > 0:
-                                    update_df.to_hdf(f"{save_path}/{date}.hd5", "/", format = "table", append=True, complevel=9)
-
-                            acq, need = len(list(set(data_df[modeMap[self.mode]]))), len(need_datetimes)
-                            self.output(f"{symbol}： 从数据库存取了{acq}, 应补{need}, 缺失了{need-acq}")
-                        else:
-                            self.output(f"{symbol}： 数据库也没能补到缺失的数据")
-                    else:
-                        self.output(f"数据库没有 {symbol} 这个品种")
-                        self.output(f"这些品种在我们的数据库里: {self.dbClient.collection_names()}")
+            for symbol, missing in missingDict.items():
+                if not missing:
+                    continue
+                if symbol not in self.dbClient.collection_names():
+                    self.output(f"数据库没有 {symbol} 这个品种")
+                    self.output(f"这些品种在我们的数据库里: {self.dbClient.collection_names()}")
+                    continue
+
+                # 按缺失的时间区间查询，需要datetime索引
+                rangeQuery = [{"datetime": {"$gte": s, "$lt": e}} for s, e in missing]
+                if len(rangeQuery) == 1:
+                    query = rangeQuery[0]
+                else:
+                    query = {"$or": rangeQuery}
+                data_df = pd.DataFrame(list(self.dbClient[symbol].find(query)))
+
+                manifest = manifestDict[symbol]
+                if data_df.size > 0:
+                    del data_df["_id"]
+                    frames[symbol].append(data_df)
+
+                    # 按日缓存到本地文件
+                    for d, update_df in data_df.groupby(data_df.datetime.dt.strftime(constant.DATE)):
+                        self.saveCacheFile(manifest, d, update_df)
+                    self.output(f"{symbol}： 从数据库存取了{len(data_df)}")
+                else:
+                    self.output(f"{symbol}： 数据库也没能补到缺失的数据")
+
+                # 已查询过的区间记入清单，数据库中没有的数据（如休市时段）以后不再查询
+                # 当天的数据还不完整，不计入覆盖范围，每次都重新查询
+                today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                for s, e in missing:
+                    if s < today:
+                        manifest.addRange(s, min(e, today))
+                manifest.save()
         else:
             self.output('没有设置回测数据库URI, 无法回补缓存数据。请在回测设置 engine.setDB_URI("mongodb://localhost:27017")')
 
+        for manifest in manifestDict.values():
+            if manifest.changed:
+                manifest.save()
+
+        # 同一时间的数据可能来自行情记录、缓存文件和数据库中的多处，只保留先读到的一份
+        for symbol, dfList in frames.items():
+            if len(dfList) > 1:
+                frames[symbol] = dropDuplicateFrames(dfList)
+
+        return frames
+
+    # ----------------------------------------------------------------------
+    def getCoverSpan(self, day, dt):
+        """
+        根据某天已有的数据推断覆盖的时间区间
+        tick数据按整天计算，bar数据为第一根bar到最后一根bar结束
+        """
+        if self.mode == self.TICK_MODE:
+            dayStart = datetime.strptime(day, constant.DATE)
+            return dayStart, dayStart + timedelta(days=1)
+        return pd.Timestamp(dt.min()).to_pydatetime(), pd.Timestamp(dt.max()).to_pydatetime() + timedelta(minutes=1)
+
+    # ----------------------------------------------------------------------
+    def getFileSpan(self, dt):
+        """缓存文件中的数据实际覆盖的时间区间，bar数据包含最后一根bar的一分钟"""
+        start = pd.Timestamp(dt.min()).to_pydatetime()
+        end = pd.Timestamp(dt.max()).to_pydatetime()
+        if self.mode == self.TICK_MODE:
+            return start, end + timedelta(microseconds=1)
+        return start, end + timedelta(minutes=1)
+
+    # ----------------------------------------------------------------------
+    def saveCacheFile(self, manifest, day, df):
+        """将某天的数据写入缓存文件，与已有数据合并去重，并更新清单"""
+        if not os.path.isdir(manifest.path):
+            os.makedirs(manifest.path)
+        filePath = os.path.join(manifest.path, f"{day}.hd5")
+        if os.path.isfile(filePath):
+            df = pd.concat([pd.read_hdf(filePath), df], sort=False)
+            df = df.drop_duplicates("datetime", keep="last").sort_values("datetime")
+        df.to_hdf(filePath, "/", format="table", mode="w", complevel=9)
+        manifest.setDay(day, df.datetime)
+
+    # ----------------------------------------------------------------------
+    def loadHistoryData(self, symbolList, startDate, endDate=None):
+        """载入历史数据:数据范围[start:end)"""
+        if not endDate:
+            endDate = datetime.strptime(self.END_OF_THE_WORLD, constant.DATETIME)
+
+        # 根据回测模式，确认要使用的数据类
+        if self.mode == self.BAR_MODE:
+            dataClass = VtCompactBarData if self.compactMode else VtBarData
+        else:
+            dataClass = VtCompactTickData if self.compactMode else VtTickData
+
+        frames = self.loadHistoryFrames(symbolList, startDate, endDate)
+        dataList = []
+        stampList = []
+        for dfList in frames.values():
+            for df in dfList:
+                dataList += [self.parseData(dataClass, item) for item in df.to_dict("records")]
+                stamps = df["datetime"].values
+                if stamps.dtype.kind != "M":
+                    stamps = pd.to_datetime(df["datetime"]).values
+                stampList.append(stamps.astype("datetime64[ns]").view(np.int64))
+
         if len(dataList) > 0:
-            dataList.sort(key=lambda x: x.datetime)
+            # 用int64时间戳做稳定排序，结果与按datetime排序数据对象相同，但不需要逐个调用python的key函数
+            order = np.argsort(np.concatenate(stampList), kind="stable")
+            dataList = [dataList[i] for i in order.tolist()]
             self.output(f"载入完成, 数据量:{len(dataList)}")
             return dataList
         else:
-            self.output(f'WARNING: 该时间段:[%s,%s) 数据量为0!' % (start, end))
+            self.output(f'WARNING: 该时间段:[%s,%s) 数据量为0!' % (startDate.strftime(constant.DATETIME), 
+                                                              endDate.strftime(constant.DATETIME)))
             return []
+
+    # ----------------------------------------------------------------------
+    def loadHistoryArray(self, symbolList, startDate, endDate=None):
+        """载入历史数据为列式数组:数据范围[start:end)，不为每行数据创建对象"""
+        if not endDate:
+            endDate = datetime.strptime(self.END_OF_THE_WORLD, constant.DATETIME)
+
+        if self.mode == self.BAR_MODE:
+            dataClass = VtBarData
+        else:
+            dataClass = VtTickData
+
+        frames = self.loadHistoryFrames(symbolList, startDate, endDate)
+        data = ColumnarData(dataClass, {symbol: pd.concat(dfList, sort=False) 
+                                        for symbol, dfList in frames.items() if dfList})
+
+        if len(data) > 0:
+            self.output(f"载入完成, 数据量:{len(data)}")
+        else:
+            self.output(f'WARNING: 该时间段:[%s,%s) 数据量为0!' % (startDate.strftime(constant.DATETIME), 
+                                                              endDate.strftime(constant.DATETIME)))
+        return data
+
+    # ----------------------------------------------------------------------
+    def loadReplayData(self, startDate, endDate, symbolList=None):
+        """根据回放模式载入策略所有品种的历史数据"""
+        if symbolList is None:
+            symbolList = self.strategy.symbolList
+        if self.columnarMode:
+            return self.loadHistoryArray(symbolList, startDate, endDate)
+        return self.loadHistoryData(symbolList, startDate, endDate)
+
+    # ----------------------------------------------------------------------
+    def getReplayDays(self):
+        """每批回放数据的天数"""
+        dataLimit = 1000000
+        if self.mode == self.BAR_MODE:
+            return max(dataLimit // (len(self.contractInfo.keys()) * 24 * 60), 1)
+        else:
+            return max(dataLimit // (len(self.contractInfo.keys()) * 24 * 60 * 60 * 5), 1)
+
+    # ----------------------------------------------------------------------
+    def prepareData(self, symbolList=None):
+        """
+        预加载回测需要的全部数据，用于优化时重复使用
+        返回列表：[初始化数据, 第1批回放数据, 第2批回放数据, ...]
+        """
+        self.output("预加载优化数据到内存中")
+        prepared_data = []
+        if self.strategyStartDate != self.dataStartDate:
+            prepared_data.append(self.loadReplayData(self.strategyStartDate, self.dataStartDate, symbolList))
+        else:
+            prepared_data.append([])
+        
+        dataDays = self.getReplayDays()
+        start = self.dataStartDate
+        stop = self.dataEndDate + timedelta(minutes = 1)
+        while start < stop:
+            end = min(start + timedelta(dataDays), stop)
+            backtest_data = self.loadReplayData(start, end, symbolList)
+            prepared_data.append(backtest_data)
+            if len(backtest_data) == 0:
+                break
+            else:
+                start = end
+        return prepared_data
         
     #----------------------------------------------------------------------
     def runBacktesting(self, prepared_data = [], cache_data =False):
         """运行回测"""
-
-        dataLimit = 1000000
         self.clearBacktestingResult()  # 清空策略的所有状态（指如果多次运行同一个策略产生的状态）
         # 首先根据回测模式，确认要使用的数据类,以及数据的分批回放范围
         if self.mode == self.BAR_MODE:
             func = self.newBar
-            dataDays = max(dataLimit // (len(self.contractInfo.keys()) * 24 * 60), 1)
         else:
             func = self.newTick
-            dataDays = max(dataLimit // (len(self.contractInfo.keys()) * 24 * 60 * 60 * 5), 1)
+        dataDays = self.getReplayDays()
         
         if cache_data:  # 为优化缓存数据到内存中
-            self.output("预加载优化数据到内存中")
-            if self.strategyStartDate != self.dataStartDate:
-                prepared_data.append(self.loadHistoryData(self.strategyStartDate, self.dataStartDate))
-            start = self.dataStartDate
-            stop = self.dataEndDate
-            while start < stop:
-                end = min(start + timedelta(dataDays), stop)
-                backtest_data = self.loadHistoryData(start, end)
-                prepared_data.append(backtest_data)
-                if len(backtest_data) == 0:
-                    break
-                else:
-                    start = end
+            prepared_data.extend(self.prepareData())
             return prepared_data
 
         # 开始回测, 加载初始化数据, 数据范围:[self.strategyStartDate,self.dataStartDate)
@@ -322,7 +515,7 @@ class BacktestingEngine(object):
             self.output(u'策略无请求历史数据初始化')
         else:
             if not prepared_data:
-                self.initData = self.loadHistoryData(self.strategyStartDate, self.dataStartDate)
+                self.initData = self.loadReplayData(self.strategyStartDate, self.dataStartDate)
             else:
                 self.initData = prepared_data[0]
             self.output(u'初始化预加载数据成功, 数据长度:%s' % (len(self.initData)))    
@@ -336,24 +529,28 @@ class BacktestingEngine(object):
 
         # 分批加载回测数据.数据范围:[self.dataStartDate,self.dataEndDate+1)
         begin = start = self.dataStartDate
-        stop = self.dataEndDate + timedelta(munutes = 1)
+        stop = self.dataEndDate + timedelta(minutes = 1)
         i = 1 # 缓存回测数据的起始位置
         self.output(f'开始回放回测数据,回测范围:[{begin.strftime(constant.DATETIME)},{stop.strftime(constant.DATETIME)})')
         while start<stop:
             end = min(start + timedelta(dataDays), stop)
             if not prepared_data:
-                self.backtestData = self.loadHistoryData(start, end)
-            else:
+                self.backtestData = self.loadReplayData(start, end)
+            elif i < len(prepared_data):
                 self.backtestData = prepared_data[i]
                 i+=1
+            else:
+                break
             if len(self.backtestData)==0:
                 break
             else:
                 self.output(f'当前回放数据:[{start.strftime(constant.DATETIME)},{end.strftime(constant.DATETIME)})')
                 oneP = len(self.backtestData)
+                lastPct = -1
                 for idx, data in enumerate(self.backtestData):
                     pct = int((idx+1)*100 / oneP)
-                    if pct%1 == 0:
+                    if pct != lastPct:      # 只在进度变化时输出，避免每条数据都写屏
+                        lastPct = pct
                         self.output(f'Progress: {str(pct)}%', True)
                     func(data)
                 start = end
@@ -439,23 +636,25 @@ class BacktestingEngine(object):
 
         symbol = data.vtSymbol
         
-        # 遍历限价单字典中的所有限价单
-        for orderID in list(self.workingLimitOrderDict):
-            order = self.workingLimitOrderDict[orderID]
-            if order.vtSymbol == symbol:
+        # 国内的tick行情在涨停时askPrice1为0，此时买无法成交；跌停时bidPrice1为0，此时卖无法成交
+        book = self.limitOrderBookDict[symbol]
+        crossed = book.popTriggered(buyCrossPrice if buyCrossPrice > 0 else float('inf'),
+                                    sellCrossPrice if sellCrossPrice > 0 else float('-inf'))
+        
+        # 只处理会成交的限价单，以及需要推送未成交状态的新委托，按委托顺序处理
+        orders = set(crossed)
+        orders.update(self.newLimitOrderDict.pop(symbol, []))
+        for order in sorted(orders, key=lambda order: int(order.orderID)):
+            orderID = order.orderID
+            if orderID in self.workingLimitOrderDict:
                 # 推送委托进入队列（未成交）的状态更新
                 if not order.status:
                     order.status = constant.STATUS_NOTTRADED
                     self.strategy.onOrder(order)
 
                 # 判断是否会成交
-                buyCross = (order.direction==constant.DIRECTION_LONG and 
-                            order.price>=buyCrossPrice and
-                            buyCrossPrice > 0)      # 国内的tick行情在涨停时askPrice1为0，此时买无法成交
-                
-                sellCross = (order.direction==constant.DIRECTION_SHORT and 
-                            order.price<=sellCrossPrice and
-                            sellCrossPrice > 0)     # 国内的tick行情在跌停时bidPrice1为0，此时卖无法成交
+                buyCross = order in crossed and order.direction==constant.DIRECTION_LONG
+                sellCross = order in crossed and order.direction==constant.DIRECTION_SHORT
                 
                 # 如果发生了成交
                 if buyCross or sellCross:
@@ -481,7 +680,7 @@ class BacktestingEngine(object):
                         self.strategy.eveningDict[symbol + "_LONG"] += order.totalVolume
                         self.strategy.posDict[symbol + "_LONG"] = round(self.strategy.posDict[symbol + "_LONG"], 4)
                         self.strategy.eveningDict[symbol + "_LONG"] = round(self.strategy.eveningDict[symbol + "_LONG"], 4)
-                        self.strategy.accountDict["balance"] += ((order.price-trade.price) * order.volume)
+                        self.strategy.accountDict["balance"] += ((order.price-trade.price) * order.totalVolume)
                     elif buyCross and trade.offset == constant.OFFSET_CLOSE:
                         trade.price = min(order.price, buyBestCrossPrice)
                         self.strategy.posDict[symbol + "_SHORT"] -= order.totalVolume
@@ -492,7 +691,7 @@ class BacktestingEngine(object):
                         self.strategy.eveningDict[symbol + "_SHORT"] += order.totalVolume
                         self.strategy.posDict[symbol + "_SHORT"] = round(self.strategy.posDict[symbol + "_SHORT"], 4)
                         self.strategy.eveningDict[symbol + "_SHORT"] = round(self.strategy.eveningDict[symbol + "_SHORT"], 4)
-                        self.strategy.accountDict["balance"] -= ((trade.price-order.price) * order.volume)
+                        self.strategy.accountDict["balance"] -= ((trade.price-order.price) * order.totalVolume)
                     elif sellCross and trade.offset == constant.OFFSET_CLOSE:
                         trade.price = max(order.price, sellBestCrossPrice)
                         self.strategy.posDict[symbol + "_LONG"] -= order.totalVolume
@@ -503,12 +702,12 @@ class BacktestingEngine(object):
                         trade.price = min(order.price, buyBestCrossPrice)
                         self.strategy.posDict[symbol + "_LONG"] += order.totalVolume
                         self.strategy.posDict[symbol + "_LONG"] = round(self.strategy.posDict[symbol + "_LONG"], 4)
-                        self.strategy.accountDict["balance"] += ((order.price-trade.price) * order.volume)
+                        self.strategy.accountDict["balance"] += ((order.price-trade.price) * order.totalVolume)
                     elif sellCross and trade.offset == constant.OFFSET_NONE:
                         trade.price = max(order.price, sellBestCrossPrice)
                         self.strategy.posDict[symbol + "_LONG"] -= order.totalVolume
                         self.strategy.posDict[symbol + "_LONG"] = round(self.strategy.posDict[symbol + "_LONG"], 4)
-                        self.strategy.accountDict["balance"] += (trade.price * order.volume)
+                        self.strategy.accountDict["balance"] += (trade.price * order.totalVolume)
 
                     trade.volume = order.totalVolume
                     trade.tradeTime = self.dt.strftime(constant.DATETIME)
@@ -541,14 +740,14 @@ class BacktestingEngine(object):
             bestCrossPrice = data.lastPrice
         symbol = data.vtSymbol
 
-        # 遍历停止单字典中的所有停止单
-
-        for stopOrderID in list(self.workingStopOrderDict):
-            so = self.workingStopOrderDict[stopOrderID]
-            if so.vtSymbol == symbol:
+        # 只取出会被触发的停止单，按发出顺序处理
+        triggered = self.stopOrderBookDict[symbol].popTriggered(buyCrossPrice, sellCrossPrice)
+        for so in sorted(triggered, key=lambda so: int(so.stopOrderID[len(STOPORDERPREFIX):])):
+            stopOrderID = so.stopOrderID
+            if so.status == STOPORDER_WAITING:
                 # 判断是否会成交
-                buyCross = so.direction==constant.DIRECTION_LONG and so.price<=buyCrossPrice
-                sellCross = so.direction==constant.DIRECTION_SHORT and so.price>=sellCrossPrice
+                buyCross = so.direction==constant.DIRECTION_LONG
+                sellCross = so.direction==constant.DIRECTION_SHORT
                 
                 # 如果发生了成交
                 if buyCross or sellCross:
@@ -678,6 +877,8 @@ class BacktestingEngine(object):
         # 保存到限价单字典中
         self.workingLimitOrderDict[orderID] = order
         self.limitOrderDict[orderID] = order
+        self.limitOrderBookDict[vtSymbol].add(order, order.direction, order.price)
+        self.newLimitOrderDict[vtSymbol].append(order)
         
         return [orderID]
     
@@ -712,6 +913,7 @@ class BacktestingEngine(object):
         # 保存stopOrder对象到字典中
         self.stopOrderDict[stopOrderID] = so
         self.workingStopOrderDict[stopOrderID] = so
+        self.stopOrderBookDict[vtSymbol].add(so, so.direction, so.price)
         
         # 推送停止单初始更新
         self.strategy.onStopOrder(so)        
@@ -737,11 +939,12 @@ class BacktestingEngine(object):
                     self.strategy.eveningDict[order.vtSymbol + '_LONG'] = round(self.strategy.posDict[order.vtSymbol + '_LONG'], 4)
             else:
                 if not (order.direction == constant.DIRECTION_SHORT and order.offset == constant.OFFSET_NONE):
-                    self.strategy.accountDict["balance"] += order.price * order.volume
+                    self.strategy.accountDict["balance"] += order.price * order.totalVolume
             
             self.strategy.onOrder(order)
 
             del self.workingLimitOrderDict[vtOrderID]
+            self.limitOrderBookDict[order.vtSymbol].remove(order)
             
     #----------------------------------------------------------------------
     def cancelStopOrder(self, stopOrderID):
@@ -751,6 +954,7 @@ class BacktestingEngine(object):
             so = self.workingStopOrderDict[stopOrderID]
             so.status = STOPORDER_CANCELLED
             del self.workingStopOrderDict[stopOrderID]
+            self.stopOrderBookDict[so.vtSymbol].remove(so)
             self.strategy.onStopOrder(so)
     
     #----------------------------------------------------------------------
@@ -835,214 +1039,160 @@ class BacktestingEngine(object):
         if not self.tradeDict:
             self.output(u'成交记录为空，无法计算回测结果')
             return {}
-        # 首先基于回测后的成交记录，计算每笔交易的盈亏
-        resultList = []             # 交易结果列表
-        deliverSheet = []
+        # 首先基于回测后的成交记录，按先开先平配对开平仓成交
+        # 未平仓的成交保存为[价格, 时间, 委托号, 剩余数量]，不修改成交对象，因此无需复制
+        longTrade = defaultdict(deque)  # 未平仓的多头交易
+        shortTrade = defaultdict(deque)  # 未平仓的空头交易
+
+        # 每笔交易结果的各列
+        entryPriceList, entryDtList, entryIDList = [], [], []
+        exitPriceList, exitDtList, exitIDList = [], [], []
+        volumeList, symbolList = [], []
 
-        longTrade = defaultdict(list)  # 未平仓的多头交易
-        shortTrade = defaultdict(list)  # 未平仓的空头交易
-        
         tradeTimeList = []          # 每笔成交时间戳
         posList = [0]               # 每笔成交后的持仓情况        
 
-        # 复制成交对象，因为下面的开平仓交易配对涉及到对成交数量的修改
-        # 若不进行复制直接操作，则计算完后所有成交的数量会变成0
-        tradeDict = copy.deepcopy(self.tradeDict)
-        for trade in tradeDict.values():
-
+        for trade in self.tradeDict.values():
+            symbol = trade.vtSymbol
             if trade.direction == constant.DIRECTION_LONG:
                 if trade.offset in [constant.OFFSET_OPEN, constant.OFFSET_NONE]:
-                    longTrade[trade.vtSymbol].append(trade)
+                    longTrade[symbol].append([trade.price, trade.tradeDatetime, trade.orderID, trade.volume])
+                    continue
                 elif trade.offset == constant.OFFSET_CLOSE:
-                    while True:
-                        entryTrade = shortTrade[trade.vtSymbol][0]
-                        exitTrade = trade
-                        
-                        # 清算开平仓交易
-                        closedVolume = min(exitTrade.volume, entryTrade.volume)
-                        result = TradingResult(entryTrade.price, entryTrade.tradeDatetime, entryTrade.orderID,
-                                               exitTrade.price, exitTrade.tradeDatetime,exitTrade.orderID,
-                                               -closedVolume, self.contractInfo[trade.vtSymbol])
-                        resultList.append(result)
-                        r = result.__dict__
-                        r.update({"symbol":trade.vtSymbol})
-                        deliverSheet.append(r)
-
-                        posList.extend([-1, 0])
-                        tradeTimeList.extend([result.entryDt, result.exitDt])
-
-                        # 计算未清算部分
-                        entryTrade.volume -= closedVolume
-                        exitTrade.volume -= closedVolume
-
-                        entryTrade.volume = round(entryTrade.volume, 4)
-                        exitTrade.volume = round(exitTrade.volume, 4)
-
-
-                        # 如果开仓交易已经全部清算，则从列表中移除
-                        if not entryTrade.volume:
-                            shortTrade[trade.vtSymbol].pop(0)
-
-                        # 如果平仓交易已经全部清算，则退出循环
-                        if not exitTrade.volume:
-                            break
-
-                        # 如果平仓交易未全部清算，
-                        if exitTrade.volume:
-                            # 且开仓交易已经全部清算完，则平仓交易剩余的部分
-                            # 等于新的反向开仓交易，添加到队列中
-                            if not shortTrade[trade.vtSymbol]:
-                                self.output("出现平空单多于空仓单的情况，请检查策略")
-                                break
-                            # 如果开仓交易还有剩余，则进入下一轮循环
-                            else:
-                                pass
-
+                    entryQueue, sign, msg = shortTrade[symbol], -1, "出现平空单多于空仓单的情况，请检查策略"
+                else:
+                    continue
             elif trade.direction == constant.DIRECTION_SHORT:
-                if trade.offset  == constant.OFFSET_OPEN:
-                    shortTrade[trade.vtSymbol].append(trade)
+                if trade.offset == constant.OFFSET_OPEN:
+                    shortTrade[symbol].append([trade.price, trade.tradeDatetime, trade.orderID, trade.volume])
+                    continue
                 elif trade.offset in [constant.OFFSET_CLOSE, constant.OFFSET_NONE]:
-                    while True:
-                        entryTrade = longTrade[trade.vtSymbol][0]
-                        exitTrade = trade
-
-                        # 清算开平仓交易
-                        closedVolume = min(exitTrade.volume, entryTrade.volume)
-                        result = TradingResult(entryTrade.price, entryTrade.tradeDatetime, entryTrade.orderID,
-                                               exitTrade.price, exitTrade.tradeDatetime, exitTrade.orderID,
-                                               closedVolume, self.contractInfo[trade.vtSymbol])
-                        resultList.append(result)
-                        r = result.__dict__
-                        r.update({"symbol":trade.vtSymbol})
-                        deliverSheet.append(r)
-
-                        posList.extend([1, 0])
-                        tradeTimeList.extend([result.entryDt, result.exitDt])
-
-                        # 计算未清算部分
-                        entryTrade.volume -= closedVolume
-                        exitTrade.volume -= closedVolume
-
-                        entryTrade.volume = round(entryTrade.volume, 4)
-                        exitTrade.volume = round(exitTrade.volume, 4)
-
-                        # 如果开仓交易已经全部清算，则从列表中移除
-                        if not entryTrade.volume:
-                            longTrade[trade.vtSymbol].pop(0)
-
-                        # 如果平仓交易已经全部清算，则退出循环
-                        if not exitTrade.volume:
-                            break
-
-                        # 如果平仓交易未全部清算，
-                        if exitTrade.volume:
-                            # 且开仓交易已经全部清算完，则平仓交易剩余的部分
-                            # 等于新的反向开仓交易，添加到队列中
-                            if not longTrade[trade.vtSymbol]:
-                                self.output("出现平多单多于多仓单的情况，请检查策略")
-                                break
-                            # 如果开仓交易还有剩余，则进入下一轮循环
-                            else:
-                                pass
-        # 到最后交易日尚未平仓的交易，则以最后价格平仓
-        for symbol, tradeList in longTrade.items():
-
-            if self.mode == self.BAR_MODE:
-                endPrice = self.barDict[symbol].close
+                    entryQueue, sign, msg = longTrade[symbol], 1, "出现平多单多于多仓单的情况，请检查策略"
+                else:
+                    continue
             else:
-                endPrice = self.tickDict[symbol].lastPrice
-
-            for trade in tradeList:
-                result = TradingResult(trade.price, trade.tradeDatetime, trade.orderID,
-                                       endPrice, self.dt, "LastDay",
-                                       trade.volume, self.contractInfo[symbol])
+                continue
 
-                resultList.append(result)
-                r = result.__dict__
-                r.update({"symbol":symbol})
-                deliverSheet.append(r)
+            volume = trade.volume
+            while volume:
+                if not entryQueue:
+                    self.output(msg)
+                    break
 
-        for symbol, tradeList in shortTrade.items():
+                # 清算开平仓交易
+                entry = entryQueue[0]
+                closedVolume = min(volume, entry[3])
+                entryPriceList.append(entry[0])
+                entryDtList.append(entry[1])
+                entryIDList.append(entry[2])
+                exitPriceList.append(trade.price)
+                exitDtList.append(trade.tradeDatetime)
+                exitIDList.append(trade.orderID)
+                volumeList.append(sign * closedVolume)
+                symbolList.append(symbol)
+
+                posList.extend([sign, 0])
+                tradeTimeList.extend([entry[1], trade.tradeDatetime])
+
+                # 计算未清算部分，开仓交易已经全部清算则移出队列
+                entry[3] = round(entry[3] - closedVolume, 4)
+                volume = round(volume - closedVolume, 4)
+                if not entry[3]:
+                    entryQueue.popleft()
 
-            if self.mode == self.BAR_MODE:
-                endPrice = self.barDict[symbol].close
-            else:
-                endPrice = self.tickDict[symbol].lastPrice
+        # 到最后交易日尚未平仓的交易，则以最后价格平仓
+        for tradeDict, sign in [(longTrade, 1), (shortTrade, -1)]:
+            for symbol, entryQueue in tradeDict.items():
+                if not entryQueue:
+                    continue
 
-            for trade in tradeList:
-                result = TradingResult(trade.price, trade.tradeDatetime, trade.orderID,
-                                       endPrice, self.dt, "LastDay",
-                                       -trade.volume, self.contractInfo[symbol])
-                resultList.append(result)
-                r = result.__dict__
-                r.update({"symbol":symbol})
-                deliverSheet.append(r)
+                if self.mode == self.BAR_MODE:
+                    endPrice = self.barDict[symbol].close
+                else:
+                    endPrice = self.tickDict[symbol].lastPrice
+
+                for entry in entryQueue:
+                    entryPriceList.append(entry[0])
+                    entryDtList.append(entry[1])
+                    entryIDList.append(entry[2])
+                    exitPriceList.append(endPrice)
+                    exitDtList.append(self.dt)
+                    exitIDList.append("LastDay")
+                    volumeList.append(sign * entry[3])
+                    symbolList.append(symbol)
 
         # 检查是否有交易
-        if not resultList:
+        if not volumeList:
             self.output(u'无交易结果')
             return {}
 
+        # 计算每笔交易的成交金额、手续费、滑点和净盈亏
+        entryPrice = np.array(entryPriceList, dtype=float)
+        exitPrice = np.array(exitPriceList, dtype=float)
+        volume = np.array(volumeList, dtype=float)
+        absVolume = np.abs(volume)
+        sizeMap = {s: self.contractInfo[s].get("size", 1) for s in set(symbolList)}
+        rateMap = {s: self.contractInfo[s].get("rate", 0) for s in set(symbolList)}
+        slippageMap = {s: self.contractInfo[s].get("slippage", 0) for s in set(symbolList)}
+        size = np.array([sizeMap[s] for s in symbolList], dtype=float)
+        rate = np.array([rateMap[s] for s in symbolList], dtype=float)
+        slippage = np.array([slippageMap[s] for s in symbolList], dtype=float)
+
+        turnover = (entryPrice + exitPrice) * size * absVolume
+        commission = turnover * rate
+        slippage = slippage * 2 * size * absVolume
+        pnl = (exitPrice - entryPrice) * volume * size - commission - slippage
+
+        # 交割单
+        resultDf = pd.DataFrame({
+            "entryPrice": entryPriceList,
+            "entryDt": entryDtList,
+            "entryID": entryIDList,
+            "exitPrice": exitPriceList,
+            "exitDt": exitDtList,
+            "exitID": exitIDList,
+            "volume": volumeList,
+            "turnover": turnover,
+            "commission": commission,
+            "slippage": slippage,
+            "pnl": pnl,
+            "symbol": symbolList
+        })
+
         # 交割单输出模块
         if self.logActive:
-            resultDF = pd.DataFrame(deliverSheet)
             filename = os.path.join(self.logPath, u"trading result.csv")
-            resultDF.to_csv(filename, index=False, sep=',', encoding="utf_8_sig")
+            resultDf.to_csv(filename, index=False, sep=',', encoding="utf_8_sig")
             self.output(u'trading result saved')
 
         # 然后基于每笔交易的结果，我们可以计算具体的盈亏曲线和最大回撤等
-        capital = 0             # 资金
-        maxCapital = 0          # 资金最高净值
-        drawdown = 0            # 回撤
-        
-        totalResult = 0         # 总成交数量
-        totalTurnover = 0       # 总成交金额（合约面值）
-        totalCommission = 0     # 总手续费
-        totalSlippage = 0       # 总滑点
-        
-        timeList = []           # 时间序列
-        pnlList = []            # 每笔盈亏序列
-        capitalList = []        # 盈亏汇总的时间序列
-        drawdownList = []       # 回撤的时间序列
-        
-        winningResult = 0       # 盈利次数
-        losingResult = 0        # 亏损次数		
-        totalWinning = 0        # 总盈利金额		
-        totalLosing = 0         # 总亏损金额       
-
-        longPnlList = []        # 多仓盈亏
-        shortPnlList = []       # 空仓盈亏
-        holdingList = []        # 持仓日记录
-
-        for result in resultList:
-            capital += result.pnl
-            maxCapital = max(capital, maxCapital)
-            drawdown = capital - maxCapital
-            
-            pnlList.append(result.pnl)
-            timeList.append(result.exitDt)      # 交易的时间戳使用平仓时间
-            capitalList.append(capital)
-            drawdownList.append(drawdown)
-            
-            totalResult += 1
-            totalTurnover += result.turnover
-            totalCommission += result.commission
-            totalSlippage += result.slippage
-            
-            if result.pnl >= 0:
-                winningResult += 1
-                totalWinning += result.pnl
-            else:
-                losingResult += 1
-                totalLosing += result.pnl
-
-            if result.volume > 0:
-                longPnlList.append(result.pnl)
-            if result.volume < 0 :
-                shortPnlList.append(result.pnl)
-
-            holdingdays = result.exitDt-result.entryDt
-            holdingList.append(holdingdays)
+        # 均按交易顺序累加，结果与逐笔累加相同
+        capitalArray = np.cumsum(pnl)                                   # 盈亏汇总的时间序列
+        maxCapitalArray = np.maximum(np.maximum.accumulate(capitalArray), 0)  # 资金最高净值
+        drawdownArray = capitalArray - maxCapitalArray                  # 回撤的时间序列
+
+        capital = float(capitalArray[-1])
+        maxCapital = float(maxCapitalArray[-1])
+        drawdown = float(drawdownArray[-1])
+
+        totalResult = len(pnl)                              # 总成交数量
+        totalTurnover = float(np.cumsum(turnover)[-1])      # 总成交金额（合约面值）
+        totalCommission = float(np.cumsum(commission)[-1])  # 总手续费
+        totalSlippage = float(np.cumsum(slippage)[-1])      # 总滑点
+
+        winning = pnl >= 0
+        winningResult = int(winning.sum())                  # 盈利次数
+        losingResult = totalResult - winningResult          # 亏损次数
+        totalWinning = float(np.cumsum(pnl[winning])[-1]) if winningResult else 0     # 总盈利金额
+        totalLosing = float(np.cumsum(pnl[~winning])[-1]) if losingResult else 0      # 总亏损金额
+
+        timeList = exitDtList                               # 交易的时间戳使用平仓时间
+        pnlList = pnl.tolist()                              # 每笔盈亏序列
+        capitalList = capitalArray.tolist()
+        drawdownList = drawdownArray.tolist()
+        longPnlList = pnl[volume > 0].tolist()              # 多仓盈亏
+        shortPnlList = pnl[volume < 0].tolist()             # 空仓盈亏
+        holdingList = [exitDt - entryDt for entryDt, exitDt in zip(entryDtList, exitDtList)]   # 持仓日记录
 
         # 计算盈亏相关数据
         winningRate = winningResult / totalResult * 100  # 胜率
@@ -1079,7 +1229,9 @@ class BacktestingEngine(object):
         d['profitLossRatio'] = profitLossRatio
         d['posList'] = posList
         d['tradeTimeList'] = tradeTimeList
-        d['resultList'] = resultList
+        d['resultDf'] = resultDf
+        # 兼容原有的逐笔交易结果列表，元素可按属性名访问entryPrice、pnl、symbol等字段
+        d['resultList'] = list(resultDf.itertuples(index=False, name='TradingResult'))
         d['holdingPeriod'] = holdingList
         
         return d
@@ -1178,11 +1330,14 @@ class BacktestingEngine(object):
         self.limitOrderCount = 0
         self.limitOrderDict.clear()
         self.workingLimitOrderDict.clear()        
+        self.limitOrderBookDict.clear()
+        self.newLimitOrderDict.clear()
         
         # 清空停止单相关
         self.stopOrderCount = 0
         self.stopOrderDict.clear()
         self.workingStopOrderDict.clear()
+        self.stopOrderBookDict.clear()
         
         # 清空成交相关
         self.tradeCount = 0
@@ -1193,7 +1348,7 @@ class BacktestingEngine(object):
         self.backtestData = []
 
         # 清空日线回测结果
-        self.dailyResultDict = defaultdict(OrderedDict)
+        self.dailyCloseDict = defaultdict(OrderedDict)
         
     #----------------------------------------------------------------------
     def runOptimization(self, strategyClass, optimizationSetting):
@@ -1218,7 +1373,7 @@ class BacktestingEngine(object):
             # 没有逐日结果，直接返回
             if not isinstance(df, pd.DataFrame) or df.size <= 0:
                 continue
-            df, d = self.calculateDailyStatistics(df)
+            d = self.calculateOptimizeStatistics(df)
             try:
                 targetValue = d[targetName]
             except KeyError:
@@ -1234,34 +1389,54 @@ class BacktestingEngine(object):
         return resultList
             
     #----------------------------------------------------------------------
-    def runParallelOptimization(self, strategyClass, optimizationSetting, strategySetting = {}, prepared_data = []):
-        """并行优化参数"""
-        import multiprocessing
-
+    def runParallelOptimization(self, strategyClass, optimizationSetting, strategySetting = {}, prepared_data = [],
+                                processes = None, resultFile = None, chunksize = None, keepResult = True):
+        """
+        并行优化参数
+        列式模式下回测数据只在主进程载入一次，保存为.npy文件，子进程启动时以只读内存映射方式读取，
+        多个进程共享同一份物理内存；对象模式下由各子进程按批次自行载入数据，不在主进程预加载，
+        传入的prepared_data则在子进程启动时传递一次，不再随每个任务传递
+        参数组合逐个生成并通过imap_unordered分发，每完成一组即追加写入resultFile（csv）；
+        resultFile中已有同一策略、合约和回测区间结果的参数组合不再重复运行，中断后重新调用即可续跑；
+        keepResult为False时不在内存中保留结果，只写入文件，适合参数组合很多的情况
+        """
         # 获取优化设置        
-        settingList = optimizationSetting.generateSetting()
+        settingCount = optimizationSetting.countSetting()
         targetName = optimizationSetting.optimizeTarget
         
         # 检查参数设置问题
-        if not settingList or not targetName:
+        if not settingCount or not targetName:
             self.output(u'优化设置有问题，请检查')
-        
-        # 多进程优化，启动一个对应CPU核心数量的进程池
-        pool = multiprocessing.Pool(multiprocessing.cpu_count()-1)
-        l = []
 
-        for setting in settingList:
-            setting.update(strategySetting)
-            self.clearBacktestingResult()  # 清空策略的所有状态（指如果多次运行同一个策略产生的状态）
-            l.append(pool.apply_async(optimize, (self.__class__, strategyClass, setting,
-                                                 targetName, self.mode,
-                                                 self.startDate, self.initHours, self.endDate,
-                                                 self.dbURI, self.dbName, self.contractInfo, prepared_data)))
-        pool.close()
-        pool.join()
-        
+        # 读取结果文件中已完成的参数组合
+        resultList = []
+        writer = None
+        doneDict = {}
+        if resultFile:
+            dateRange = '%s~%s' %(self.strategyStartDate.strftime(constant.DATETIME),
+                                  self.dataEndDate.strftime(constant.DATETIME))
+            writer = OptimizationResultFile(resultFile, strategyClass.__name__,
+                                            ','.join(sorted(self.contractInfo)), dateRange)
+            doneDict = writer.load()
+
+        settingIter = (dict(setting, **strategySetting) for setting in optimizationSetting.iterSetting())
+        if doneDict:
+            doneCount = 0
+            for setting in optimizationSetting.iterSetting():
+                result = doneDict.get(writer.getKey(dict(setting, **strategySetting)))
+                if result:
+                    doneCount += 1
+                    if keepResult:
+                        resultList.append(result)
+            settingCount -= doneCount
+            settingIter = (setting for setting in settingIter if writer.getKey(setting) not in doneDict)
+            self.output(u'结果文件中已完成%s组参数，剩余%s组' %(doneCount, settingCount))
+
+        if settingCount > 0:
+            self.runOptimizationPool(strategyClass, targetName, settingIter, settingCount, writer,
+                                     resultList if keepResult else None, prepared_data, processes, chunksize)
+
         # 显示结果
-        resultList = [res.get() for res in l]
         resultList.sort(reverse=True, key=lambda result:result[1])
         self.output('-' * 30)
         self.output(u'优化结果：')
@@ -1270,15 +1445,63 @@ class BacktestingEngine(object):
             
         return resultList
 
+    #----------------------------------------------------------------------
+    def runOptimizationPool(self, strategyClass, targetName, settingIter, settingCount, writer,
+                            resultList, prepared_data=[], processes=None, chunksize=None):
+        """启动进程池运行参数组合，结果写入writer并添加到resultList（为None时不保留）"""
+        import multiprocessing
+
+        # 列式模式下在主进程预加载数据，对象数据无法共享内存，仍由子进程各自分批载入
+        if not prepared_data and self.columnarMode:
+            prepared_data = self.prepareData(list(self.contractInfo.keys()))
+
+        dataPath = None
+        if prepared_data and self.columnarMode:
+            dataPath = tempfile.mkdtemp(prefix='vnpy_opt_')
+            publishData(prepared_data, dataPath)
+            prepared_data = []
+            self.output(f'回测数据已发布到共享文件: {dataPath}')
+        
+        # 多进程优化，启动一个对应CPU核心数量的进程池
+        if not processes:
+            processes = max(multiprocessing.cpu_count()-1, 1)
+
+        # 每个进程约分到4批任务，单批不超过16组，保证结果能及时写入文件
+        if not chunksize:
+            chunksize = min(max(settingCount // (processes * 4), 1), 16)
+
+        pool = multiprocessing.Pool(processes, initializer=initOptimizeWorker, 
+                                    initargs=(dataPath, prepared_data))
+        func = partial(optimize, self.__class__, strategyClass, targetName=targetName, mode=self.mode,
+                       startDate=self.startDate, initHours=self.initHours, endDate=self.endDate,
+                       dbURI=self.dbURI, dbName=self.dbName, contractInfo=self.contractInfo,
+                       columnarMode=self.columnarMode, compactMode=self.compactMode,
+                       cachePath=self.cachePath, storePath=self.storePath)
+        self.clearBacktestingResult()  # 清空策略的所有状态（指如果多次运行同一个策略产生的状态）
+
+        try:
+            if writer:
+                writer.open()
+
+            for result in pool.imap_unordered(func, settingIter, chunksize):
+                if writer:
+                    writer.write(result)
+                if resultList is not None:
+                    resultList.append(result)
+
+            pool.close()
+            pool.join()
+        finally:
+            pool.terminate()
+            if writer:
+                writer.close()
+            if dataPath:
+                shutil.rmtree(dataPath, ignore_errors=True)
+
     #----------------------------------------------------------------------
     def updateDailyClose(self, symbol, dt, price):
         """更新每日收盘价"""
-        date = dt.date()
-        resultDict = self.dailyResultDict[symbol]
-        if date not in resultDict:
-            resultDict[date] = DailyResult(symbol, date, price)
-        else:
-            resultDict[date].closePrice = price
+        self.dailyCloseDict[symbol][dt.date()] = price
             
     #----------------------------------------------------------------------
     def calculateDailyResult(self):
@@ -1290,42 +1513,77 @@ class BacktestingEngine(object):
             self.output(u'成交记录为空，无法计算回测结果')
             return {}
 
-        dailyResultDict = copy.deepcopy(self.dailyResultDict)
-        
-        # 将成交添加到每日交易结果中
-        for trade in self.tradeDict.values():
-            date = trade.dt.date()
-            symbol = trade.vtSymbol
-            dailyResult = self.dailyResultDict[symbol][date]
-            dailyResult.addTrade(trade)
-
-        resultDf = pd.DataFrame([])
-        for symbol, resultDictByDay in self.dailyResultDict.items():
-
-            # 遍历计算每日结果
-            previousClose = 0
-            openPosition = 0
-            for dailyResult in resultDictByDay.values():
-                dailyResult.previousClose = previousClose
-                previousClose = dailyResult.closePrice
-
-                dailyResult.calculatePnl(openPosition, self.contractInfo[symbol])
-                openPosition = dailyResult.closePosition
-
-            # 生成DataFrame
-            resultDf = pd.concat(
-                [resultDf, pd.DataFrame([item.__dict__ for item in resultDictByDay.values()])], axis=0
-            )
-
-        resultDf = resultDf.sort_values(by=['date', 'symbol']).set_index(['date', 'symbol'])
-        resultDf = resultDf[
-            ['netPnl', 'slippage', 'commission', 'turnover', 'tradeCount',
-             'tradingPnl', 'positionPnl', 'totalPnl']
-        ]
-
-        # 恢复self.dailyResultDict未被修改前的状态，防止重复调用本方法结果计算出错
-        self.dailyResultDict = dailyResultDict
-        return resultDf.groupby(level=['date']).sum()
+        # 成交数据转为数组，保持成交顺序
+        tradeList = list(self.tradeDict.values())
+        symbolCode, symbolUnique = pd.factorize(pd.Index([trade.vtSymbol for trade in tradeList], dtype=object))
+        symbolCodeDict = {symbol: code for code, symbol in enumerate(symbolUnique)}
+        tradeDate = pd.DatetimeIndex([trade.tradeDatetime for trade in tradeList]).values.astype('datetime64[D]')
+        tradeVolume = np.array([trade.volume for trade in tradeList], dtype=float)
+        tradePrice = np.array([trade.price for trade in tradeList], dtype=float)
+        isLong = np.array([trade.direction for trade in tradeList], dtype=object) == constant.DIRECTION_LONG
+        tradePos = np.where(isLong, tradeVolume, -tradeVolume)
+
+        symbolRankDict = {symbol: rank for rank, symbol in enumerate(sorted(self.dailyCloseDict))}
+        dateList = []
+        dayList = []
+        rankList = []
+        columnDict = defaultdict(list)
+        for symbol, closeDict in self.dailyCloseDict.items():
+            contractInfo = self.contractInfo[symbol]
+            size = contractInfo.get("size", 1)
+            rate = contractInfo.get("rate", 0)
+            slippage = contractInfo.get("slippage", 0)
+
+            # 每日收盘价，按日期先后排列
+            days = list(closeDict.keys())
+            n = len(days)
+            dayArray = pd.DatetimeIndex(days).values.astype('datetime64[D]')
+            closePrice = np.array(list(closeDict.values()), dtype=float)
+            previousClose = np.concatenate(([0.0], closePrice[:-1]))
+
+            # 成交所在交易日的序号，同一日内保持成交顺序
+            mask = symbolCode == symbolCodeDict.get(symbol, -1)
+            sorter = np.argsort(dayArray, kind='stable')
+            dayIndex = sorter[np.searchsorted(dayArray, tradeDate[mask], sorter=sorter)]
+            order = np.argsort(dayIndex, kind='stable')
+            dayIndex = dayIndex[order]
+            pos = tradePos[mask][order]
+            volume = tradeVolume[mask][order]
+            price = tradePrice[mask][order]
+
+            # 交易部分，bincount按成交顺序逐笔累加
+            turnover = price * volume * size
+            tradeCount = np.bincount(dayIndex, minlength=n)
+            tradingPnl = np.bincount(dayIndex, pos * (closePrice[dayIndex] - price) * size, n)
+            turnoverDaily = np.bincount(dayIndex, turnover, n)
+            commission = np.bincount(dayIndex, turnover * rate, n)
+            slippageDaily = np.bincount(dayIndex, volume * size * slippage, n)
+
+            # 持仓部分，收盘持仓为截至当日最后一笔成交的累计仓位
+            cumPos = np.concatenate(([0.0], np.cumsum(pos)))
+            closePosition = cumPos[np.searchsorted(dayIndex, np.arange(n), side='right')]
+            openPosition = np.concatenate(([0.0], closePosition[:-1]))
+            positionPnl = openPosition * (closePrice - previousClose) * size
+
+            # 汇总
+            totalPnl = tradingPnl + positionPnl
+            netPnl = totalPnl - commission - slippageDaily
+
+            dateList.extend(days)
+            dayList.append(dayArray)
+            rankList.append(np.full(n, symbolRankDict[symbol]))
+            for key, value in (('netPnl', netPnl), ('slippage', slippageDaily), ('commission', commission),
+                               ('turnover', turnoverDaily), ('tradeCount', tradeCount),
+                               ('tradingPnl', tradingPnl), ('positionPnl', positionPnl),
+                               ('totalPnl', totalPnl)):
+                columnDict[key].append(value)
+
+        # 按日期、合约排序后按日汇总
+        order = np.lexsort((np.concatenate(rankList), np.concatenate(dayList)))
+        dateIndex = pd.Index(np.array(dateList, dtype=object)[order], name='date')
+        resultDf = pd.DataFrame({key: np.concatenate(value)[order] for key, value in columnDict.items()},
+                                index=dateIndex)
+        return resultDf.groupby(level='date').sum()
     
     #----------------------------------------------------------------------
     def calculateDailyStatistics(self, df):
@@ -1412,6 +1670,16 @@ class BacktestingEngine(object):
 
         return df, result
     
+    #----------------------------------------------------------------------
+    def calculateOptimizeStatistics(self, df):
+        """计算按日统计的结果，只返回统计字典，不生成图表和文件，供参数优化使用"""
+        if not isinstance(df, pd.DataFrame) or df.size <= 0:
+            return {}
+
+        return calculateStatistics(df.index[0], df.index[-1], df['netPnl'].values,
+                                   df['commission'].values, df['slippage'].values,
+                                   df['turnover'].values, df['tradeCount'].values, self.capital)
+
     #----------------------------------------------------------------------
     def showDailyResult(self, df=None, result=None):
         """显示按日统计的交易结果"""
@@ -1483,105 +1751,259 @@ class BacktestingEngine(object):
 
         plt.show()
         
+#----------------------------------------------------------------------
+def mergeRanges(ranges):
+    """合并重叠或相邻的时间区间"""
+    result = []
+    for s, e in sorted(ranges):
+        if result and s <= result[-1][1]:
+            if e > result[-1][1]:
+                result[-1][1] = e
+        else:
+            result.append([s, e])
+    return [tuple(r) for r in result]
+
+
+#----------------------------------------------------------------------
+def subtractRanges(start, end, ranges):
+    """[start, end)中未被ranges覆盖的区间"""
+    result = []
+    for s, e in mergeRanges(ranges):
+        if e <= start or s >= end:
+            continue
+        if s > start:
+            result.append((start, s))
+        start = max(start, e)
+    if start < end:
+        result.append((start, end))
+    return result
+
+
+#----------------------------------------------------------------------
+def dropDuplicateFrames(dfList):
+    """按datetime去除多个DataFrame之间及内部的重复数据，保留先出现的一份"""
+    result = []
+    seen = np.array([], dtype="datetime64[ns]")
+    for df in dfList:
+        stamps = pd.to_datetime(df["datetime"]).values.astype("datetime64[ns]")
+        mask = ~(np.isin(stamps, seen) | pd.Index(stamps).duplicated())
+        if not mask.all():
+            df = df[mask]
+        if len(df) > 0:
+            result.append(df)
+        seen = np.concatenate([seen, stamps[mask]])
+    return result
+
+
 ########################################################################
-class TradingResult(object):
-    """每笔交易的结果"""
+class CacheManifest(object):
+    """
+    回测本地缓存的清单，保存在每个品种的缓存目录下
+    ranges：已经查询过数据库的时间区间[start, end)，区间内缓存文件中没有的数据，
+    数据库中也没有（例如休市时段），不需要再查询
+    days：每个缓存文件的行数和首尾时间，key为日期，用于规划需要打开的文件
+    """
+    fileName = 'manifest.json'
 
     #----------------------------------------------------------------------
-    def __init__(self, entryPrice, entryDt, entryID, exitPrice, 
-                 exitDt, exitID, volume, contractInfo):
+    def __init__(self, path):
         """Constructor"""
-        self.entryPrice = entryPrice    # 开仓价格
-        self.entryDt = entryDt          # 开仓时间datetime
-        self.entryID = entryID
+        self.path = path
+        self.filePath = os.path.join(path, self.fileName)
+        self.ranges = []
+        self.days = {}
+        self.changed = False
+        self.load()
 
-        self.exitPrice = exitPrice      # 平仓价格
-        self.exitDt = exitDt            # 平仓时间
-        self.exitID = exitID
+    #----------------------------------------------------------------------
+    def load(self):
+        """读取清单"""
+        if not os.path.isfile(self.filePath):
+            return
+        with open(self.filePath) as f:
+            d = json.load(f)
+        self.ranges = [(datetime.fromisoformat(s), datetime.fromisoformat(e)) for s, e in d.get('ranges', [])]
+        for day, info in d.get('days', {}).items():
+            self.days[day] = {
+                'rows': info['rows'],
+                'start': datetime.fromisoformat(info['start']),
+                'end': datetime.fromisoformat(info['end'])
+            }
 
-        self.volume = volume            # 交易数量（+/-代表方向）
+    #----------------------------------------------------------------------
+    def save(self):
+        """保存清单"""
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        d = {
+            'ranges': [(s.isoformat(), e.isoformat()) for s, e in self.ranges],
+            'days': {day: {'rows': info['rows'], 
+                           'start': info['start'].isoformat(), 
+                           'end': info['end'].isoformat()} 
+                     for day, info in sorted(self.days.items())}
+        }
+        with open(self.filePath, 'w') as f:
+            json.dump(d, f, indent=1)
+        self.changed = False
 
-        size = contractInfo.get("size", 1)
-        rate = contractInfo.get("rate", 0)
-        slippage = contractInfo.get("slippage", 0)
+    #----------------------------------------------------------------------
+    def addRange(self, start, end):
+        """添加已覆盖的区间"""
+        self.ranges = mergeRanges(self.ranges + [(start, end)])
+        self.changed = True
 
-        self.turnover = (self.entryPrice + self.exitPrice) * size * abs(volume)   # 成交金额
+    #----------------------------------------------------------------------
+    def setDay(self, day, dt):
+        """记录某天缓存文件的行数和首尾时间"""
+        self.days[day] = {
+            'rows': len(dt),
+            'start': pd.Timestamp(dt.min()).to_pydatetime(),
+            'end': pd.Timestamp(dt.max()).to_pydatetime()
+        }
+        self.changed = True
 
-        self.commission = self.turnover * rate                              # 手续费成本   
-        self.slippage = slippage * 2 * size * abs(volume)                   # 滑点成本
+    #----------------------------------------------------------------------
+    def removeDay(self, day):
+        """清除某天的记录和覆盖范围"""
+        self.days.pop(day, None)
+        dayStart = datetime.strptime(day, constant.DATE)
+        dayEnd = dayStart + timedelta(days=1)
+        ranges = []
+        for s, e in self.ranges:
+            ranges += subtractRanges(s, e, [(dayStart, dayEnd)])
+        self.ranges = ranges
+        self.changed = True
+
+    #----------------------------------------------------------------------
+    def getMissing(self, start, end, extra=()):
+        """[start, end)中未覆盖的区间，extra为额外已覆盖的区间"""
+        return subtractRanges(start, end, self.ranges + list(extra))
 
-        self.pnl = ((self.exitPrice - self.entryPrice) * volume * size 
-                    - self.commission - self.slippage)                      # 净盈亏
-        
 
 ########################################################################
-class DailyResult(object):
-    """每日交易的结果"""
+class ColumnarData(object):
+    """
+    列式历史数据，用于回测回放
+    数据按列保存为numpy数组，迭代时每个品种复用同一个数据对象，
+    只更新字段值，不再为每一行数据创建对象
+    """
+    chunkSize = 100000      # 每批转换为python数值的行数
+    symbolFields = ['vtSymbol', 'symbol', 'exchange', 'gatewayName']   # 同一品种不变的字段
+    skipFields = ['_id', 'rawData', 'datetime']
 
     #----------------------------------------------------------------------
-    def __init__(self, symbol, date, closePrice):
-        """Constructor"""
-        self.symbol = symbol
-        self.date = date                # 日期
-        self.closePrice = closePrice    # 当日收盘价
-        self.previousClose = 0          # 昨日收盘价
-        
-        self.tradeList = []             # 成交列表
-        self.tradeCount = 0             # 成交数量
-        
-        self.openPosition = 0           # 开盘时的持仓
-        self.closePosition = 0          # 收盘时的持仓
-        
-        self.tradingPnl = 0             # 交易盈亏
-        self.positionPnl = 0            # 持仓盈亏
-        self.totalPnl = 0               # 总盈亏
-        
-        self.turnover = 0               # 成交量
-        self.commission = 0             # 手续费
-        self.slippage = 0               # 滑点
-        self.netPnl = 0                 # 净盈亏
-        
+    def __init__(self, dataClass, frames):
+        """
+        dataClass: VtBarData或VtTickData
+        frames: {vtSymbol: DataFrame}
+        """
+        self.dataClass = dataClass
+        self.symbolList = []            # 品种列表，位置即品种编号
+        self.symbolInfo = []            # 每个品种不变的字段
+        self.columns = OrderedDict()    # 字段名: numpy数组
+        self.symbolIndex = np.empty(0, dtype=np.int16)          # 每行数据的品种编号
+        self.datetime = np.empty(0, dtype='datetime64[ns]')     # 每行数据的时间
+
+        frames = {symbol: df for symbol, df in frames.items() if df.size > 0}
+        if not frames:
+            return
+
+        dfList = []
+        for idx, (symbol, df) in enumerate(frames.items()):
+            info = {'vtSymbol': symbol}
+            for name in self.symbolFields:
+                if name in df.columns:
+                    info[name] = df[name].iloc[0]
+            self.symbolList.append(symbol)
+            self.symbolInfo.append(info)
+            dfList.append(df.assign(_symbolIndex=idx))
+        df = pd.concat(dfList, ignore_index=True, sort=False)
+
+        # 各品种数据按时间稳定排序合并
+        dt = pd.to_datetime(df['datetime']).values
+        order = np.argsort(dt.view(np.int64), kind='mergesort')
+        self.datetime = dt[order]
+        self.symbolIndex = df['_symbolIndex'].values.astype(np.int16)[order]
+
+        for name in df.columns:
+            if name in self.skipFields or name in self.symbolFields or name == '_symbolIndex':
+                continue
+            values = df[name].to_numpy()
+            if values.dtype.kind == 'O':
+                values = values.astype(str)     # 字符串列转为定长数组，不保留python对象
+            self.columns[name] = values[order]
+
     #----------------------------------------------------------------------
-    def addTrade(self, trade):
-        """添加交易"""
-        self.tradeList.append(trade)
+    def __len__(self):
+        """数据行数"""
+        return len(self.datetime)
 
     #----------------------------------------------------------------------
-    def calculatePnl(self, openPosition=0, contractInfo = {}):
-        """
-        计算盈亏
-        size: 合约乘数
-        rate：手续费率
-        slippage：滑点点数
-        """
-        size = contractInfo.get("size", 1)
-        rate = contractInfo.get("rate", 0)
-        slippage = contractInfo.get("slippage", 0)
-
-        # 持仓部分
-        self.openPosition = openPosition
-        self.positionPnl = self.openPosition * (self.closePrice - self.previousClose) * size
-        self.closePosition = self.openPosition
-        
-        # 交易部分
-        self.tradeCount = len(self.tradeList)
-        
-        for trade in self.tradeList:
-            if trade.direction == constant.DIRECTION_LONG:
-                posChange = trade.volume
+    def __iter__(self):
+        """按时间顺序回放，返回的是该品种复用的数据对象"""
+        views = []
+        for info in self.symbolInfo:
+            data = self.dataClass()
+            data.__dict__.update(info)
+            views.append(data)
+
+        names = list(self.columns.keys())
+        for begin in range(0, len(self), self.chunkSize):
+            end = begin + self.chunkSize
+            symbolChunk = self.symbolIndex[begin:end].tolist()
+            dtChunk = self.datetime[begin:end].astype('datetime64[us]').tolist()
+            if names:
+                rowChunk = zip(*[self.columns[name][begin:end].tolist() for name in names])
             else:
-                posChange = -trade.volume
+                rowChunk = repeat((), len(symbolChunk))
+
+            for idx, dt, row in zip(symbolChunk, dtChunk, rowChunk):
+                data = views[idx]
+                d = data.__dict__
+                d.update(zip(names, row))
+                d['datetime'] = dt
+                yield data
 
-            self.tradingPnl += posChange * (self.closePrice - trade.price) * size
-            self.turnover += trade.price * trade.volume * size
-            self.closePosition += posChange
+    #----------------------------------------------------------------------
+    def save(self, path):
+        """保存为.npy文件，其他进程可以用load以内存映射方式读取"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'datetime.npy'), self.datetime)
+        np.save(os.path.join(path, 'symbolIndex.npy'), self.symbolIndex)
+        for i, values in enumerate(self.columns.values()):
+            np.save(os.path.join(path, f'column{i}.npy'), values)
+
+        meta = {
+            'dataClass': self.dataClass,
+            'symbolList': self.symbolList,
+            'symbolInfo': self.symbolInfo,
+            'columns': list(self.columns.keys())
+        }
+        with open(os.path.join(path, 'meta.pkl'), 'wb') as f:
+            pickle.dump(meta, f)
 
-            self.commission += trade.price * trade.volume * size * rate
-            self.slippage += trade.volume * size * slippage
+    #----------------------------------------------------------------------
+    @classmethod
+    def load(cls, path, mmapMode='r'):
+        """读取save保存的数据，默认只读内存映射，不复制数据"""
+        with open(os.path.join(path, 'meta.pkl'), 'rb') as f:
+            meta = pickle.load(f)
+
+        data = cls(meta['dataClass'], {})
+        data.symbolList = meta['symbolList']
+        data.symbolInfo = meta['symbolInfo']
+        data.datetime = np.load(os.path.join(path, 'datetime.npy'), mmap_mode=mmapMode)
+        data.symbolIndex = np.load(os.path.join(path, 'symbolIndex.npy'), mmap_mode=mmapMode)
+        for i, name in enumerate(meta['columns']):
+            data.columns[name] = np.load(os.path.join(path, f'column{i}.npy'), mmap_mode=mmapMode)
+        return data
 
-        # 汇总
-        self.totalPnl = self.tradingPnl + self.positionPnl
-        self.netPnl = self.totalPnl - self.commission - self.slippage
+    #----------------------------------------------------------------------
+    @property
+    def nbytes(self):
+        """数组占用的内存字节数"""
+        return (self.datetime.nbytes + self.symbolIndex.nbytes 
+                + sum(values.nbytes for values in self.columns.values()))
 
 
 ########################################################################
@@ -1629,37 +2051,240 @@ class OptimizationSetting(object):
     #----------------------------------------------------------------------
     def generateSetting(self):
         """生成优化参数组合"""
+        return list(self.iterSetting())
+
+    #----------------------------------------------------------------------
+    def iterSetting(self):
+        """逐个生成优化参数组合，不在内存中展开全部组合"""
         # 参数名的列表
-        nameList = self.paramDict.keys()
-        paramList = self.paramDict.values()
-        
-        # 使用迭代工具生产参数对组合
-        productList = list(product(*paramList))
-        
-        # 把参数对组合打包到一个个字典组成的列表中
-        settingList = []
-        for p in productList:
-            d = dict(zip(nameList, p))
-            settingList.append(d)
-    
-        return settingList
+        nameList = list(self.paramDict.keys())
+
+        # 把参数对组合打包成字典
+        for p in product(*self.paramDict.values()):
+            yield dict(zip(nameList, p))
+
+    #----------------------------------------------------------------------
+    def countSetting(self):
+        """优化参数组合的数量"""
+        count = 1
+        for paramList in self.paramDict.values():
+            count *= len(paramList)
+        return count
     
     #----------------------------------------------------------------------
     def setOptimizeTarget(self, target):
         """设置优化目标字段"""
         self.optimizeTarget = target
 
+########################################################################
+class OptimizationResultFile(object):
+    """
+    参数优化结果文件，每完成一组参数追加一行csv并立即写盘，进程崩溃时已完成的结果不会丢失
+    strategy、symbols、dateRange列标识策略、合约和回测区间，setting列为参数字典的json，
+    其余列为优化目标值和按日统计结果；重新运行时通过load读取已完成的结果，实现断点续跑
+    """
+    statisticsKeys = ['startDate', 'endDate', 'totalDays', 'profitDays', 'lossDays',
+                      'endBalance', 'maxDrawdown', 'maxDdPercent', 'totalNetPnl', 'dailyNetPnl',
+                      'totalCommission', 'dailyCommission', 'totalSlippage', 'dailySlippage',
+                      'totalTurnover', 'dailyTurnover', 'totalTradeCount', 'dailyTradeCount',
+                      'totalReturn', 'annualizedReturn', 'dailyReturn', 'returnStd', 'sharpeRatio']
+    intKeys = {'totalDays', 'profitDays', 'lossDays', 'totalTradeCount'}
+    strKeys = {'startDate', 'endDate'}
+    fieldNames = ['strategy', 'symbols', 'dateRange', 'setting', 'targetValue'] + statisticsKeys
+
+    #----------------------------------------------------------------------
+    def __init__(self, path, strategy='', symbols='', dateRange=''):
+        """Constructor"""
+        self.path = path
+        self.strategy = strategy
+        self.symbols = symbols
+        self.dateRange = dateRange
+        self.file = None
+        self.writer = None
+
+    #----------------------------------------------------------------------
+    @staticmethod
+    def getKey(setting):
+        """参数字典对应的key，即setting列的内容"""
+        return json.dumps(setting, sort_keys=True, default=str)
+
+    #----------------------------------------------------------------------
+    def load(self):
+        """读取同一策略、合约和回测区间下已完成的优化结果，返回以getKey为key的字典"""
+        resultDict = {}
+        if not os.path.isfile(self.path):
+            return resultDict
+
+        with open(self.path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                if (row.get('strategy') != self.strategy or row.get('symbols') != self.symbols
+                        or row.get('dateRange') != self.dateRange):
+                    continue
+
+                # 崩溃时只写了一半的行无法解析，跳过后重新计算
+                try:
+                    setting = json.loads(row['setting'])
+                    targetValue = float(row['targetValue'])
+                    d = {}
+                    if row.get('startDate'):
+                        for key in self.statisticsKeys:
+                            value = row[key]
+                            if key in self.intKeys:
+                                value = int(value)
+                            elif key not in self.strKeys:
+                                value = float(value)
+                            d[key] = value
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                resultDict[row['setting']] = (setting, targetValue, d)
+        return resultDict
+
+    #----------------------------------------------------------------------
+    def open(self):
+        """以追加方式打开文件，新文件先写入表头"""
+        newFile = not os.path.isfile(self.path) or not os.path.getsize(self.path)
+
+        # 上次运行崩溃在写入过程中时，文件末尾没有换行，先补上
+        brokenLine = False
+        if not newFile:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                brokenLine = f.read(1) not in (b'\n', b'\r')
+
+        self.file = open(self.path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, self.fieldNames, restval='', extrasaction='ignore')
+        if newFile:
+            self.writer.writeheader()
+        elif brokenLine:
+            self.file.write('\r\n')
+        self.file.flush()
+
+    #----------------------------------------------------------------------
+    def write(self, result):
+        """追加一组参数的优化结果"""
+        setting, targetValue, d = result
+        row = dict(d)
+        row['strategy'] = self.strategy
+        row['symbols'] = self.symbols
+        row['dateRange'] = self.dateRange
+        row['setting'] = self.getKey(setting)
+        row['targetValue'] = targetValue
+        self.writer.writerow(row)
+        self.file.flush()
+
+    #----------------------------------------------------------------------
+    def close(self):
+        """关闭文件"""
+        if self.file:
+            self.file.close()
+            self.file = None
+            self.writer = None
+
+
 #----------------------------------------------------------------------
 def formatNumber(n):
     """格式化数字到字符串"""
     rn = round(n, 2)        # 保留两位小数
     return format(rn, ',')  # 加上千分符
 
+#----------------------------------------------------------------------
+def calculateStatistics(startDate, endDate, netPnl, commission, slippage, turnover, tradeCount, capital):
+    """
+    基于numpy数组计算按日统计结果，只返回统计字典
+    结果与calculateDailyStatistics相同，但不生成DataFrame中间列，供参数优化使用
+    """
+    totalDays = len(netPnl)
+
+    balance = np.cumsum(netPnl) + capital
+    highlevel = np.maximum.accumulate(balance)
+    drawdown = balance - highlevel
+    returns = netPnl / capital
+
+    endBalance = balance[-1]
+    totalNetPnl = netPnl.sum()
+    totalCommission = commission.sum()
+    totalSlippage = slippage.sum()
+    totalTurnover = turnover.sum()
+    totalTradeCount = tradeCount.sum()
+
+    totalReturn = (endBalance / capital - 1) * 100
+    dailyReturn = returns.mean() * 100
+    returnStd = returns.std(ddof=1) * 100 if totalDays > 1 else np.nan
+
+    if returnStd:
+        sharpeRatio = dailyReturn / returnStd * np.sqrt(240)
+    else:
+        sharpeRatio = 0
+
+    return {
+        'startDate': startDate.strftime("%Y-%m-%d"),
+        'endDate': endDate.strftime("%Y-%m-%d"),
+        'totalDays': totalDays,
+        'profitDays': int(np.count_nonzero(netPnl > 0)),
+        'lossDays': int(np.count_nonzero(netPnl < 0)),
+        'endBalance': endBalance,
+        'maxDrawdown': drawdown.min(),
+        'maxDdPercent': (drawdown / highlevel * 100).min(),
+        'totalNetPnl': totalNetPnl,
+        'dailyNetPnl': totalNetPnl / totalDays,
+        'totalCommission': totalCommission,
+        'dailyCommission': totalCommission / totalDays,
+        'totalSlippage': totalSlippage,
+        'dailySlippage': totalSlippage / totalDays,
+        'totalTurnover': totalTurnover,
+        'dailyTurnover': totalTurnover / totalDays,
+        'totalTradeCount': totalTradeCount,
+        'dailyTradeCount': totalTradeCount / totalDays,
+        'totalReturn': totalReturn,
+        'annualizedReturn': totalReturn / totalDays * 240,
+        'dailyReturn': dailyReturn,
+        'returnStd': returnStd,
+        'sharpeRatio': sharpeRatio
+    }
+
+# 优化子进程中共享的回测数据，由initOptimizeWorker在进程启动时设置
+_sharedData = []
+
+#----------------------------------------------------------------------
+def publishData(prepared_data, path):
+    """把预加载的列式数据保存到目录中，每批数据一个子目录"""
+    for i, data in enumerate(prepared_data):
+        if isinstance(data, ColumnarData):
+            data.save(os.path.join(path, str(i)))
+        else:
+            os.makedirs(os.path.join(path, str(i)))
+
+#----------------------------------------------------------------------
+def attachData(path):
+    """以只读内存映射方式读取publishData保存的数据"""
+    prepared_data = []
+    for i in range(len(os.listdir(path))):
+        batchPath = os.path.join(path, str(i))
+        if os.listdir(batchPath):
+            prepared_data.append(ColumnarData.load(batchPath))
+        else:
+            prepared_data.append([])
+    return prepared_data
+
+#----------------------------------------------------------------------
+def initOptimizeWorker(dataPath=None, prepared_data=[]):
+    """优化子进程的初始化函数"""
+    global _sharedData
+    if dataPath:
+        _sharedData = attachData(dataPath)
+    else:
+        _sharedData = prepared_data
+
 #----------------------------------------------------------------------
 def optimize(backtestEngineClass, strategyClass, setting, targetName,
              mode, startDate, initHours, endDate,
-             dbURI, dbName, contractInfo={}, prepared_data = []):
+             dbURI, dbName, contractInfo={}, prepared_data = [], columnarMode = False, compactMode = False,
+             cachePath = None, storePath = None):
     """多进程优化时跑在每个进程中运行的函数"""
+    if not prepared_data:
+        prepared_data = _sharedData
+
     engine = backtestEngineClass()
     engine.setBacktestingMode(mode)
     engine.setStartDate(startDate, initHours)
@@ -1667,12 +2292,18 @@ def optimize(backtestEngineClass, strategyClass, setting, targetName,
     engine.setContracts(contractInfo)
     engine.setDB_URI(dbURI)
     engine.setDatabase(dbName)
+    engine.setColumnarMode(columnarMode)
+    engine.setCompactMode(compactMode)
+    if cachePath:
+        engine.setCachePath(cachePath)
+    engine.setStorePath(storePath)
     
-    engine.initStrategy(strategyClass, setting)
+    # initStrategy会向参数字典写入symbolList，传入副本，返回的setting与结果文件的key保持为输入参数
+    engine.initStrategy(strategyClass, dict(setting))
     engine.runBacktesting(prepared_data)
     
     df = engine.calculateDailyResult()
-    df, d = engine.calculateDailyStatistics(df)
+    d = engine.calculateOptimizeStatistics(df)
     try:
         targetValue = d[targetName]
     except KeyError:
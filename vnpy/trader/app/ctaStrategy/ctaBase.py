@@ -4,8 +4,13 @@
 本文件中包含了CTA模块中用到的一些基础设置、类和常量等。
 '''
 
+# 本模块会被from .ctaBase import *导入，内部使用的模块以下划线别名导入，避免覆盖导入方的名称
+import heapq as _heapq
+from itertools import count as _count
+
 # CTA引擎中涉及的数据类定义
 from vnpy.trader.vtConstant import EMPTY_UNICODE, EMPTY_STRING, EMPTY_FLOAT, EMPTY_INT
+from vnpy.trader.language import constant as _constant
 
 # 常量定义
 # CTA引擎中涉及到的交易方向类型
@@ -56,4 +61,87 @@ class StopOrder(object):
         
         self.strategy = None             # 下停止单的策略对象
         self.stopOrderID = EMPTY_STRING  # 停止单的本地编号 
-        self.status = EMPTY_STRING       # 停止单状态
\ No newline at end of file
+        self.status = EMPTY_STRING       # 停止单状态
+
+
+########################################################################
+class OrderBook(object):
+    """
+    单个合约的委托簿
+    多头、空头委托分别按价格保存在堆中，行情只需要弹出堆顶满足条件的委托。
+    limitMode为False时为停止单簿：多头价格<=longPrice、空头价格>=shortPrice时触发；
+    limitMode为True时为限价单簿：多头价格>=longPrice、空头价格<=shortPrice时成交。
+    撤销后的委托不从堆中查找删除，而是在到达堆顶时跳过（惰性删除）。
+    """
+
+    #----------------------------------------------------------------------
+    def __init__(self, limitMode=False, isActive=None):
+        """Constructor"""
+        self.sign = -1 if limitMode else 1
+        self.isActive = isActive or isStopOrderActive  # 判断委托是否仍然有效的函数
+
+        self.longHeap = []      # (排序价格, 序号, 委托)
+        self.shortHeap = []
+        self.counter = _count()  # 同价格的委托按加入顺序弹出
+        self.orderSet = set()    # 仍在堆中的委托
+        self.staleSet = set()    # 已撤销但仍在堆中的委托
+
+    #----------------------------------------------------------------------
+    def __len__(self):
+        """堆中的委托数量（含未清理的失效委托）"""
+        return len(self.longHeap) + len(self.shortHeap)
+
+    #----------------------------------------------------------------------
+    def add(self, order, direction, price):
+        """加入委托"""
+        self.orderSet.add(order)
+        if direction == _constant.DIRECTION_LONG:
+            _heapq.heappush(self.longHeap, (self.sign * price, next(self.counter), order))
+        else:
+            _heapq.heappush(self.shortHeap, (-self.sign * price, next(self.counter), order))
+
+    #----------------------------------------------------------------------
+    def remove(self, order):
+        """
+        委托被撤销，失效数量过多时重建堆
+        已经被popTriggered弹出的委托（例如在触发后的回调中撤销）不再计入
+        """
+        if order not in self.orderSet:
+            return
+
+        self.staleSet.add(order)
+        stale = len(self.staleSet)
+        if stale > 64 and stale * 2 > len(self):
+            self.longHeap = [item for item in self.longHeap if self.isActive(item[2])]
+            self.shortHeap = [item for item in self.shortHeap if self.isActive(item[2])]
+            _heapq.heapify(self.longHeap)
+            _heapq.heapify(self.shortHeap)
+            self.orderSet = set(item[2] for item in self.longHeap)
+            self.orderSet.update(item[2] for item in self.shortHeap)
+            self.staleSet.clear()
+
+    #----------------------------------------------------------------------
+    def popTriggered(self, longPrice, shortPrice):
+        """弹出满足条件的有效委托，多头在前、空头在后，各自按价格优先排列"""
+        triggered = []
+        for heap, limit in ((self.longHeap, self.sign * longPrice),
+                            (self.shortHeap, -self.sign * shortPrice)):
+            while heap and heap[0][0] <= limit:
+                order = _heapq.heappop(heap)[2]
+                self.orderSet.discard(order)
+                self.staleSet.discard(order)
+                if self.isActive(order):
+                    triggered.append(order)
+        return triggered
+
+
+#----------------------------------------------------------------------
+def isStopOrderActive(so):
+    """停止单是否仍在等待中"""
+    return so.status == STOPORDER_WAITING
+
+
+#----------------------------------------------------------------------
+def isLimitOrderActive(order):
+    """限价单是否仍在活动中"""
+    return order.status not in (_constant.STATUS_ALLTRADED, _constant.STATUS_CANCELLED)
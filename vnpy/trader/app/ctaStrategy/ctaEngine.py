@@ -73,6 +73,9 @@ class CtaEngine(object):
         # key为stopOrderID，value为stopOrder对象
         self.stopOrderDict = {}             # 停止单撤销后不会从本字典中删除
         self.workingStopOrderDict = {}      # 停止单撤销后会从本字典中删除
+        
+        # 按合约索引的等待中停止单，key为vtSymbol，value为OrderBook
+        self.stopOrderBookDict = defaultdict(OrderBook)
 
         # 保存策略名称和委托号列表的字典
         # key为name，value为保存orderID（限价+本地停止）的集合
@@ -278,6 +281,7 @@ class CtaEngine(object):
         # 保存stopOrder对象到字典中
         self.stopOrderDict[stopOrderID] = so
         self.workingStopOrderDict[stopOrderID] = so
+        self.stopOrderBookDict[vtSymbol].add(so, so.direction, so.price)
 
         # 保存stopOrderID到策略委托号集合中
         self.strategyOrderDict[strategy.name].add(stopOrderID)
@@ -300,6 +304,7 @@ class CtaEngine(object):
 
             # 从活动停止单字典中移除
             del self.workingStopOrderDict[stopOrderID]
+            self.stopOrderBookDict[so.vtSymbol].remove(so)
 
             # 从策略委托号集合中移除
             s = self.strategyOrderDict[strategy.name]
@@ -315,49 +320,52 @@ class CtaEngine(object):
         vtSymbol = tick.vtSymbol
 
         # 首先检查是否有策略交易该合约
-        if vtSymbol in self.tickStrategyDict:
-            # 遍历等待中的停止单，检查是否会被触发
-            for so in list(self.workingStopOrderDict.values()):
-                if so.vtSymbol == vtSymbol:
-                    longTriggered = so.direction==constant.DIRECTION_LONG and tick.lastPrice>=so.price        # 多头停止单被触发
-                    shortTriggered = so.direction==constant.DIRECTION_SHORT and tick.lastPrice<=so.price     # 空头停止单被触发
-
-                    if longTriggered or shortTriggered:
-                        # 买入和卖出分别以涨停跌停价发单（模拟市价单）
-                        # 对于没有涨跌停价格的市场则使用5档报价
-                        if so.direction==constant.DIRECTION_LONG:
-                            if tick.upperLimit:
-                                price = tick.upperLimit
-                            else:
-                                price = tick.askPrice5
-                        else:
-                            if tick.lowerLimit:
-                                price = tick.lowerLimit
-                            else:
-                                price = tick.bidPrice5
-                        
-                        # 发出市价委托
-                        vtOrderID = self.sendOrder(so.vtSymbol, so.orderType, 
-                                                   price, so.volume, so.priceType, so.strategy)
-                        
-                        # 检查因为风控流控等原因导致的委托失败（无委托号）
-                        if vtOrderID:
-                            # 从活动停止单字典中移除该停止单
-                            del self.workingStopOrderDict[so.stopOrderID]
-                            
-                            # 从策略委托号集合中移除
-                            s = self.strategyOrderDict[so.strategy.name]
-                            if so.stopOrderID in s:
-                                s.remove(so.stopOrderID)
-                            
-                            # 更新停止单状态，并通知策略
-                            so.status = STOPORDER_TRIGGERED
-                            so.strategy.onStopOrder(so)
+        book = self.stopOrderBookDict.get(vtSymbol)
+        if vtSymbol in self.tickStrategyDict and book:
+            # 只取出该合约被触发的停止单：多头最新价>=触发价，空头最新价<=触发价
+            for so in book.popTriggered(tick.lastPrice, tick.lastPrice):
+                # 前一个停止单的回调中可能撤销了后面的停止单
+                if so.status != STOPORDER_WAITING:
+                    continue
+
+                # 买入和卖出分别以涨停跌停价发单（模拟市价单）
+                # 对于没有涨跌停价格的市场则使用5档报价
+                if so.direction==constant.DIRECTION_LONG:
+                    if tick.upperLimit:
+                        price = tick.upperLimit
+                    else:
+                        price = tick.askPrice5
+                else:
+                    if tick.lowerLimit:
+                        price = tick.lowerLimit
+                    else:
+                        price = tick.bidPrice5
+                
+                # 发出市价委托
+                vtOrderID = self.sendOrder(so.vtSymbol, so.orderType, 
+                                           price, so.volume, so.priceType, so.strategy)
+                
+                # 检查因为风控流控等原因导致的委托失败（无委托号）
+                if vtOrderID:
+                    # 从活动停止单字典中移除该停止单
+                    del self.workingStopOrderDict[so.stopOrderID]
+                    
+                    # 从策略委托号集合中移除
+                    s = self.strategyOrderDict[so.strategy.name]
+                    if so.stopOrderID in s:
+                        s.remove(so.stopOrderID)
+                    
+                    # 更新停止单状态，并通知策略
+                    so.status = STOPORDER_TRIGGERED
+                    so.strategy.onStopOrder(so)
+                else:
+                    # 发单失败，停止单继续等待下一个行情
+                    book.add(so, so.direction, so.price)
 
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
         """处理行情推送"""
-        tick = event.dict_['data']
+        tick = event.data
         # 收到tick行情后，先处理本地停止单（检查是否要立即发出）
         self.processStopOrder(tick)
 
@@ -381,7 +389,7 @@ class CtaEngine(object):
     #----------------------------------------------------------------------
     def processOrderEvent(self, event):
         """处理委托推送"""
-        order = event.dict_['data']
+        order = event.data
         vtOrderID = order.vtOrderID
         if vtOrderID in self.orderStrategyDict:
             strategy = self.orderStrategyDict[vtOrderID]
@@ -425,7 +433,7 @@ class CtaEngine(object):
     #----------------------------------------------------------------------
     def processTradeEvent(self, event):
         """处理成交推送"""
-        trade = event.dict_['data']
+        trade = event.data
         # 过滤已经收到过的成交回报
         if trade.vtTradeID in self.tradeSet:
             return
@@ -453,7 +461,7 @@ class CtaEngine(object):
     def processPositionEvent(self, event):
         """处理持仓推送"""
         
-        pos = event.dict_['data']
+        pos = event.data
 
         for strategy in self.strategyDict.values():
             if strategy.inited and pos.vtSymbol in strategy.symbolList:
@@ -477,7 +485,7 @@ class CtaEngine(object):
     #------------------------------------------------------
     def processAccountEvent(self,event):
         """账户推送"""
-        account = event.dict_['data']
+        account = event.data
 
         for strategy in self.strategyDict.values():
             if strategy.inited:
@@ -486,7 +494,7 @@ class CtaEngine(object):
 
     #------------------------------------------------------
     def processErrorEvent(self,event):
-        error = event.dict_['data']
+        error = event.data
 
         for strategy in self.strategyDict.values():
             if strategy.inited:
@@ -597,6 +605,10 @@ class CtaEngine(object):
                     self.tickStrategyDict[vtSymbol] = l
                 l.append(strategy)
 
+            # 分片事件引擎需要将同一策略的合约分配到同一个处理线程
+            if hasattr(self.eventEngine, 'groupSymbols'):
+                self.eventEngine.groupSymbols(vtSymbolset)
+
     #-----------------------------------------------------------------------
     def subscribeMarketData(self, strategy):
         """订阅行情"""
@@ -775,14 +787,12 @@ class CtaEngine(object):
         strategy = self.strategyDict[name]
         d = {k:strategy.__getattribute__(k) for k in strategy.varList}
         
-        event = Event(EVENT_CTA_STRATEGY+name)
-        event.dict_['data'] = d
+        event = Event(EVENT_CTA_STRATEGY+name, d)
         self.eventEngine.put(event)
         
         d2 = {k:str(v) for k,v in d.items()}
         d2['name'] = name
-        event2 = Event(EVENT_CTA_STRATEGY)
-        event2.dict_['data'] = d2
+        event2 = Event(EVENT_CTA_STRATEGY, d2)
         self.eventEngine.put(event2)    
 
     #----------------------------------------------------------------------
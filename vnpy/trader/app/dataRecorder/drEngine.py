@@ -15,11 +15,15 @@ from collections import OrderedDict
 from datetime import datetime, timedelta
 from queue import Queue, Empty
 from threading import Thread
-from pymongo.errors import DuplicateKeyError
+from timeit import default_timer
+
+from pymongo.errors import BulkWriteError
 
 from vnpy.event import Event
 from vnpy.trader.vtEvent import *
 from vnpy.trader.vtFunction import todayDate, getJsonPath
+from vnpy.trader.vtStore import DataStore, TICK_STORE, BAR_STORE
+from vnpy.trader import vtText
 from vnpy.trader.vtObject import VtSubscribeReq, VtLogData, VtBarData, VtTickData
 from vnpy.trader.app.ctaStrategy.ctaTemplate import BarGenerator
 # from vnpy.trader.app.ctaStrategy.ctaTemplate import BarManager
@@ -35,6 +39,9 @@ class DrEngine(object):
     
     settingFileName = 'DR_setting.json'
     settingFilePath = getJsonPath(settingFileName, __file__)  
+    
+    flushSize = 1000        # 单个集合缓存达到该数量时批量写入
+    flushInterval = 1.0     # 距离上次写入超过该秒数时写入全部缓存
 
     #----------------------------------------------------------------------
     def __init__(self, mainEngine, eventEngine):
@@ -62,6 +69,18 @@ class DrEngine(object):
         self.queue = Queue()                    # 队列
         self.thread = Thread(target=self.run)   # 线程
         
+        # 批量写入相关
+        self.dbConnected = True                 # 上次写入时主引擎的数据库是否已连接，用于只在断开时记录一次日志
+        self.dropCount = 0                      # 数据库未连接时丢弃的文档数量
+        self.store = None                       # 本地文件存储，设置后不再写入数据库
+        self.bufferDict = {}                    # key为(dbName, collectionName)，value为待写入的文档列表
+        self.bufferCount = 0                    # 缓存中的文档数量
+        self.flushCount = 0                     # 批量写入次数
+        self.insertCount = 0                    # 写入的文档数量
+        self.lastFlushLatency = 0               # 最近一次写入耗时（秒）
+        self.maxFlushLatency = 0                # 最大写入耗时（秒）
+        self.totalFlushLatency = 0              # 累计写入耗时（秒）
+        
         # 载入设置，订阅行情
         self.loadSetting()
         
@@ -81,6 +100,15 @@ class DrEngine(object):
             working = drSetting['working']
             if not working:
                 return
+            
+            # 批量写入配置
+            self.flushSize = drSetting.get('flushSize', self.flushSize)
+            self.flushInterval = drSetting.get('flushInterval', self.flushInterval)
+            
+            # 本地文件存储配置，例如{"path": "D:/vnpy_store", "compression": "zstd"}
+            if drSetting.get('store'):
+                storeSetting = drSetting['store']
+                self.store = DataStore(storeSetting['path'], storeSetting.get('compression'))
 
             # Tick记录配置
             if 'tick' in drSetting:
@@ -170,11 +198,25 @@ class DrEngine(object):
     def getSetting(self):
         """获取配置"""
         return self.settingDict, self.activeSymbolDict
+    
+    #----------------------------------------------------------------------
+    def getStatus(self):
+        """获取写入状态"""
+        return {
+            'queueDepth': self.queue.qsize(),
+            'bufferCount': self.bufferCount,
+            'flushCount': self.flushCount,
+            'insertCount': self.insertCount,
+            'dropCount': self.dropCount,
+            'lastFlushLatency': self.lastFlushLatency,
+            'maxFlushLatency': self.maxFlushLatency,
+            'avgFlushLatency': self.totalFlushLatency / self.flushCount if self.flushCount else 0
+        }
 
     #----------------------------------------------------------------------
     def procecssTickEvent(self, event):
         """处理行情事件"""
-        tick = event.dict_['data']
+        tick = event.data
         vtSymbol = tick.vtSymbol
         
         # 生成datetime对象
@@ -232,28 +274,93 @@ class DrEngine(object):
     #----------------------------------------------------------------------
     def insertData(self, dbName, collectionName, data):
         """插入数据到数据库（这里的data可以是VtTickData或者VtBarData）"""
-        self.queue.put((dbName, collectionName, data.__dict__))
+        # 复制一份，避免写入前数据对象被修改，以及写入时添加的_id污染数据对象
+        if hasattr(data, 'toDict'):
+            d = data.toDict()
+        else:
+            d = copy.copy(data.__dict__)
+        self.queue.put((dbName, collectionName, d))
         
     #----------------------------------------------------------------------
     def run(self):
-        """运行插入线程"""
-        while self.active:
+        """运行插入线程，停止后先写完队列和缓存中的数据再退出"""
+        lastFlush = default_timer()
+        
+        while self.active or not self.queue.empty():
+            timeout = max(lastFlush + self.flushInterval - default_timer(), 0.01)
             try:
-                dbName, collectionName, d = self.queue.get(block=True, timeout=1)
+                dbName, collectionName, d = self.queue.get(block=True, timeout=timeout)
                 
-                # 这里采用MongoDB的update模式更新数据，在记录tick数据时会由于查询
-                # 过于频繁，导致CPU占用和硬盘读写过高后系统卡死，因此不建议使用
-                #flt = {'datetime': d['datetime']}
-                #self.mainEngine.dbUpdate(dbName, collectionName, d, flt, True)
+                key = (dbName, collectionName)
+                buf = self.bufferDict.setdefault(key, [])
+                buf.append(d)
+                self.bufferCount += 1
                 
-                # 使用insert模式更新数据，可能存在时间戳重复的情况，需要用户自行清洗
-                try:
-                    self.mainEngine.dbInsert(dbName, collectionName, d)
-                except DuplicateKeyError:
-                    self.writeDrLog(u'键值重复插入失败，报错信息：%s' %traceback.format_exc())
+                if len(buf) >= self.flushSize:
+                    self.flush(key)
             except Empty:
                 pass
             
+            if default_timer() - lastFlush >= self.flushInterval:
+                self.flushAll()
+                lastFlush = default_timer()
+        
+        self.flushAll()
+    
+    #----------------------------------------------------------------------
+    def flushAll(self):
+        """写入全部缓存"""
+        for key in list(self.bufferDict.keys()):
+            self.flush(key)
+    
+    #----------------------------------------------------------------------
+    def flush(self, key):
+        """批量写入一个集合的缓存"""
+        docs = self.bufferDict.pop(key, None)
+        if not docs:
+            return
+        self.bufferCount -= len(docs)
+        
+        # 使用insert模式更新数据，可能存在时间戳重复的情况，需要用户自行清洗
+        # ordered=False时单条失败不影响其余文档写入
+        dbName, collectionName = key
+        start = default_timer()
+        try:
+            if self.store:
+                kind = TICK_STORE if dbName == TICK_DB_NAME else BAR_STORE
+                self.store.write(kind, collectionName, docs)
+                self.insertCount += len(docs)
+            else:
+                dbClient = self.getDbClient()
+                if dbClient is None:
+                    self.dropCount += len(docs)
+                    return
+                result = dbClient[dbName][collectionName].insert_many(docs, ordered=False)
+                self.insertCount += len(result.inserted_ids)
+        except BulkWriteError as e:
+            self.insertCount += e.details.get('nInserted', 0)
+            self.writeDrLog(u'%s批量插入部分失败，失败数量：%s' %(collectionName, len(e.details.get('writeErrors', []))))
+        except Exception:
+            self.writeDrLog(u'%s批量插入失败，丢弃数据%s条，报错信息：%s' %(collectionName, len(docs), traceback.format_exc()))
+        
+        latency = default_timer() - start
+        self.flushCount += 1
+        self.lastFlushLatency = latency
+        self.maxFlushLatency = max(self.maxFlushLatency, latency)
+        self.totalFlushLatency += latency
+    
+    #----------------------------------------------------------------------
+    def getDbClient(self):
+        """获取主引擎的MongoDB客户端，未连接时返回None，并在断开后的第一次写入时记录日志"""
+        dbClient = self.mainEngine.dbClient
+        if dbClient is None:
+            if self.dbConnected:
+                self.writeDrLog(vtText.DATA_INSERT_FAILED)
+            self.dbConnected = False
+        else:
+            self.dbConnected = True
+        return dbClient
+            
     #----------------------------------------------------------------------
     def start(self):
         """启动"""
@@ -157,12 +157,10 @@ class StDataEngine(object):
     #----------------------------------------------------------------------
     def putSpreadTickEvent(self, spread):
         """发出价差行情更新事件"""
-        event1 = Event(EVENT_SPREADTRADING_TICK+spread.name)
-        event1.dict_['data'] = spread
+        event1 = Event(EVENT_SPREADTRADING_TICK+spread.name, spread)
         self.eventEngine.put(event1)
         
-        event2 = Event(EVENT_SPREADTRADING_TICK)
-        event2.dict_['data'] = spread
+        event2 = Event(EVENT_SPREADTRADING_TICK, spread)
         self.eventEngine.put(event2)        
     
     #----------------------------------------------------------------------
@@ -49,6 +49,18 @@ SUBGATEWAY_NAME = "FUTURE"
 class OkexfRestApi(RestClient):
     """Futures REST API实现"""
 
+    # 限速规则：(method, 路径正则, 次数, 秒数)
+    rateLimits = [
+        ('POST', r'/api/futures/v3/order$', 40, 2),
+        ('POST', r'/api/futures/v3/cancel_order/', 40, 2),
+        ('GET', r'/api/futures/v3/instruments$', 20, 2),
+        ('GET', r'/api/futures/v3/accounts/[^/]+$', 20, 2),
+        ('GET', r'/api/futures/v3/accounts$', 1, 10),
+        ('GET', r'/api/futures/v3/[^/]+/position$', 20, 2),
+        ('GET', r'/api/futures/v3/position$', 5, 2),
+        ('GET', r'/api/futures/v3/orders/[^/]+$', 20, 2),
+    ]
+
     #----------------------------------------------------------------------
     def __init__(self, gateway):
         """Constructor"""
@@ -819,7 +831,7 @@ class OkexfWebsocketApi(WebsocketClient):
         self.sendPacket(req4)
 
         # 创建Tick对象
-        tick = VtTickData()
+        tick = VtCompactTickData()
         tick.gatewayName = self.gatewayName
         tick.symbol = symbol
         tick.exchange = 'OKEX'
@@ -43,6 +43,16 @@ SUBGATEWAY_NAME = "SPOT"
 class OkexSpotRestApi(RestClient):
     """SPOT REST API实现"""
 
+    # 限速规则：(method, 路径正则, 次数, 秒数)
+    rateLimits = [
+        ('POST', r'/api/spot/v3/orders$', 100, 2),
+        ('POST', r'/api/spot/v3/cancel_orders/', 100, 2),
+        ('GET', r'/api/spot/v3/instruments$', 20, 2),
+        ('GET', r'/api/spot/v3/accounts/[^/]+$', 20, 2),
+        ('GET', r'/api/spot/v3/accounts$', 20, 2),
+        ('GET', r'/api/spot/v3/orders_pending$', 20, 2),
+    ]
+
     #----------------------------------------------------------------------
     def __init__(self, gateway):
         """Constructor"""
@@ -702,7 +712,7 @@ class OkexSpotWebsocketApi(WebsocketClient):
         self.sendPacket(req3)
         
         # 创建Tick对象
-        tick = VtTickData()
+        tick = VtCompactTickData()
         tick.gatewayName = self.gatewayName
         tick.symbol = symbol
         tick.exchange = 'OKEX'
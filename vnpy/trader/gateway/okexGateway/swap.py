@@ -54,6 +54,18 @@ SUBGATEWAY_NAME = "SWAP"
 class OkexSwapRestApi(RestClient):
     """永续合约 REST API实现"""
 
+    # 限速规则：(method, 路径正则, 次数, 秒数)
+    rateLimits = [
+        ('POST', r'/api/swap/v3/order$', 40, 2),
+        ('POST', r'/api/swap/v3/cancel_order/', 40, 2),
+        ('GET', r'/api/swap/v3/instruments$', 20, 2),
+        ('GET', r'/api/swap/v3/[^/]+/accounts$', 20, 2),
+        ('GET', r'/api/swap/v3/accounts$', 1, 10),
+        ('GET', r'/api/swap/v3/[^/]+/position$', 20, 2),
+        ('GET', r'/api/swap/v3/position$', 1, 10),
+        ('GET', r'/api/swap/v3/orders/[^/]+$', 20, 2),
+    ]
+
     #----------------------------------------------------------------------
     def __init__(self, gateway):
         """Constructor"""
@@ -753,7 +765,7 @@ class OkexSwapWebsocketApi(WebsocketClient):
         self.sendPacket(req4)
         
         # 创建Tick对象
-        tick = VtTickData()
+        tick = VtCompactTickData()
         tick.gatewayName = self.gatewayName
         tick.symbol = symbol
         tick.exchange = 'OKEX'
@@ -423,20 +423,20 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def processTickEvent(self, event):
         """处理成交事件"""
-        tick = event.dict_['data']
+        tick = event.data
         self.tickDict[tick.vtSymbol] = tick    
     
     #----------------------------------------------------------------------
     def processContractEvent(self, event):
         """处理合约事件"""
-        contract = event.dict_['data']
+        contract = event.data
         self.contractDict[contract.vtSymbol] = contract
         self.contractDict[contract.symbol] = contract       # 使用常规代码（不包括交易所）可能导致重复
     
     #----------------------------------------------------------------------
     def processOrderEvent(self, event):
         """处理委托事件"""
-        order = event.dict_['data']        
+        order = event.data        
         self.orderDict[order.vtOrderID] = order
         
         # 如果订单的状态是全部成交或者撤销，则需要从workingOrderDict中移除
@@ -454,7 +454,7 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def processTradeEvent(self, event):
         """处理成交事件"""
-        trade = event.dict_['data']
+        trade = event.data
         
         self.tradeDict[trade.vtTradeID] = trade
     
@@ -465,7 +465,7 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def processPositionEvent(self, event):
         """处理持仓事件"""
-        pos = event.dict_['data']
+        pos = event.data
         
         self.positionDict[pos.vtPositionName] = pos
     
@@ -476,19 +476,19 @@ class DataEngine(object):
     #----------------------------------------------------------------------
     def processAccountEvent(self, event):
         """处理账户事件"""
-        account = event.dict_['data']
+        account = event.data
         self.accountDict[account.vtAccountID] = account
     
     #----------------------------------------------------------------------
     def processLogEvent(self, event):
         """处理日志事件"""
-        log = event.dict_['data']
+        log = event.data
         self.logList.append(log)
     
     #----------------------------------------------------------------------
     def processErrorEvent(self, event):
         """处理错误事件"""
-        error = event.dict_['data']
+        error = event.data
         self.errorList.append(error)
         
     #----------------------------------------------------------------------
@@ -730,7 +730,7 @@ class LogEngine(object):
     #----------------------------------------------------------------------
     def processLogEvent(self, event):
         """处理日志事件"""
-        log = event.dict_['data']
+        log = event.data
         function = self.levelFunctionDict[log.logLevel]     # 获取日志级别对应的处理函数
         msg = '\t'.join([log.gatewayName, log.logContent])
         function(msg)
\ No newline at end of file
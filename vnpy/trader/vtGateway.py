@@ -23,90 +23,77 @@ class VtGateway(object):
     def onTick(self, tick):
         """市场行情推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_TICK)
-        event1.dict_['data'] = tick
+        event1 = Event(EVENT_TICK, tick)
         self.eventEngine.put(event1)
         
         # 特定合约代码的事件
-        event2 = Event(type_=EVENT_TICK+tick.vtSymbol)
-        event2.dict_['data'] = tick
+        event2 = Event(EVENT_TICK+tick.vtSymbol, tick)
         self.eventEngine.put(event2)
     
     #----------------------------------------------------------------------
     def onTrade(self, trade):
         """成交信息推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_TRADE)
-        event1.dict_['data'] = trade
+        event1 = Event(EVENT_TRADE, trade)
         self.eventEngine.put(event1)
         
         # 特定合约的成交事件
-        event2 = Event(type_=EVENT_TRADE+trade.vtSymbol)
-        event2.dict_['data'] = trade
+        event2 = Event(EVENT_TRADE+trade.vtSymbol, trade)
         self.eventEngine.put(event2)        
     
     #----------------------------------------------------------------------
     def onOrder(self, order):
         """订单变化推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_ORDER)
-        event1.dict_['data'] = order
+        event1 = Event(EVENT_ORDER, order)
         self.eventEngine.put(event1)
         
         # 特定订单编号的事件
-        event2 = Event(type_=EVENT_ORDER+order.vtOrderID)
-        event2.dict_['data'] = order
+        event2 = Event(EVENT_ORDER+order.vtOrderID, order)
         self.eventEngine.put(event2)
     
     #----------------------------------------------------------------------
     def onPosition(self, position):
         """持仓信息推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_POSITION)
-        event1.dict_['data'] = position
+        event1 = Event(EVENT_POSITION, position)
         self.eventEngine.put(event1)
         
         # 特定合约代码的事件
-        event2 = Event(type_=EVENT_POSITION+position.vtSymbol)
-        event2.dict_['data'] = position
+        event2 = Event(EVENT_POSITION+position.vtSymbol, position)
         self.eventEngine.put(event2)
     
     #----------------------------------------------------------------------
     def onAccount(self, account):
         """账户信息推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_ACCOUNT)
-        event1.dict_['data'] = account
+        event1 = Event(EVENT_ACCOUNT, account)
         self.eventEngine.put(event1)
         
         # 特定合约代码的事件
         if account.vtAccountID:
-            event2 = Event(type_=EVENT_ACCOUNT+account.vtAccountID)
-            event2.dict_['data'] = account
+            event2 = Event(EVENT_ACCOUNT+account.vtAccountID, account)
             self.eventEngine.put(event2)
     
     #----------------------------------------------------------------------
     def onError(self, error):
         """错误信息推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_ERROR)
-        event1.dict_['data'] = error
+        event1 = Event(EVENT_ERROR, error)
         self.eventEngine.put(event1)    
         
     #----------------------------------------------------------------------
     def onLog(self, log):
         """日志推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_LOG)
-        event1.dict_['data'] = log
+        event1 = Event(EVENT_LOG, log)
         self.eventEngine.put(event1)
         
     #----------------------------------------------------------------------
     def onContract(self, contract):
         """合约基础信息推送"""
         # 通用事件
-        event1 = Event(type_=EVENT_CONTRACT)
-        event1.dict_['data'] = contract
+        event1 = Event(EVENT_CONTRACT, contract)
         self.eventEngine.put(event1)        
     
     #----------------------------------------------------------------------
@@ -6,6 +6,8 @@ from logging import INFO
 from vnpy.trader.vtConstant import (EMPTY_STRING, EMPTY_UNICODE, 
                                     EMPTY_FLOAT, EMPTY_INT)
 
+_newObject = object.__new__     # 复制__slots__对象时跳过__init__
+
 
 ########################################################################
 class VtBaseData(object):
@@ -127,6 +129,263 @@ class VtBarData(VtBaseData):
         self.openInterest = EMPTY_INT       # 持仓量    
     
 
+########################################################################
+class VtCompactTickData(object):
+    """
+    使用__slots__的Tick行情数据类，字段名与VtTickData相同
+    每个对象不再持有__dict__，内存占用更少，copy也更快，
+    但不能添加VtTickData以外的字段；OKEX接口每次行情推送都会copy该类的对象
+    """
+    __slots__ = ('gatewayName', 'rawData', 'symbol', 'exchange', 'vtSymbol',
+                 'lastPrice', 'lastVolume', 'volume', 'openInterest', 'time', 'date',
+                 'datetime', 'type', 'volumeChange', 'localTime', 'lastTradedTime',
+                 'openPrice', 'highPrice', 'lowPrice', 'preClosePrice', 'upperLimit',
+                 'lowerLimit', 'bidPrice1', 'bidPrice2', 'bidPrice3', 'bidPrice4',
+                 'bidPrice5', 'bidPrice6', 'bidPrice7', 'bidPrice8', 'bidPrice9',
+                 'bidPrice10', 'askPrice1', 'askPrice2', 'askPrice3', 'askPrice4',
+                 'askPrice5', 'askPrice6', 'askPrice7', 'askPrice8', 'askPrice9',
+                 'askPrice10', 'bidVolume1', 'bidVolume2', 'bidVolume3', 'bidVolume4',
+                 'bidVolume5', 'bidVolume6', 'bidVolume7', 'bidVolume8', 'bidVolume9',
+                 'bidVolume10', 'askVolume1', 'askVolume2', 'askVolume3', 'askVolume4',
+                 'askVolume5', 'askVolume6', 'askVolume7', 'askVolume8', 'askVolume9',
+                 'askVolume10')
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.gatewayName = EMPTY_STRING         # Gateway名称        
+        self.rawData = None                     # 原始数据
+        
+        # 代码相关
+        self.symbol = EMPTY_STRING              # 合约代码
+        self.exchange = EMPTY_STRING            # 交易所代码
+        self.vtSymbol = EMPTY_STRING            # 合约在vt系统中的唯一代码，通常是 合约代码:交易所代码
+        
+        # 成交数据
+        self.lastPrice = EMPTY_FLOAT            # 最新成交价
+        self.lastVolume = EMPTY_FLOAT           # 最新成交量
+        self.volume = EMPTY_FLOAT               # 今天总成交量
+        self.openInterest = EMPTY_INT           # 持仓量
+        self.time = EMPTY_STRING                # 时间 11:20:56.5
+        self.date = EMPTY_STRING                # 日期 20151009
+        self.datetime = None                    # python的datetime时间对象
+
+        self.type = EMPTY_STRING                # 主动买或主动卖
+        self.volumeChange = EMPTY_INT           # 标记tick的更新源
+        self.localTime = None                   # 本地时间，datetime 格式
+        self.lastTradedTime = EMPTY_STRING      # 最新成交时间
+
+        # 常规行情
+        self.openPrice = EMPTY_FLOAT            # 今日开盘价
+        self.highPrice = EMPTY_FLOAT            # 今日最高价
+        self.lowPrice = EMPTY_FLOAT             # 今日最低价
+        self.preClosePrice = EMPTY_FLOAT        # 前一日的收盘价
+        
+        self.upperLimit = EMPTY_FLOAT           # 涨停价
+        self.lowerLimit = EMPTY_FLOAT           # 跌停价
+        
+        # 十档行情
+        self.bidPrice1 = EMPTY_FLOAT
+        self.bidPrice2 = EMPTY_FLOAT
+        self.bidPrice3 = EMPTY_FLOAT
+        self.bidPrice4 = EMPTY_FLOAT
+        self.bidPrice5 = EMPTY_FLOAT
+        self.bidPrice6 = EMPTY_FLOAT
+        self.bidPrice7 = EMPTY_FLOAT
+        self.bidPrice8 = EMPTY_FLOAT
+        self.bidPrice9 = EMPTY_FLOAT
+        self.bidPrice10 = EMPTY_FLOAT
+        
+        self.askPrice1 = EMPTY_FLOAT
+        self.askPrice2 = EMPTY_FLOAT
+        self.askPrice3 = EMPTY_FLOAT
+        self.askPrice4 = EMPTY_FLOAT
+        self.askPrice5 = EMPTY_FLOAT      
+        self.askPrice6 = EMPTY_FLOAT
+        self.askPrice7 = EMPTY_FLOAT
+        self.askPrice8 = EMPTY_FLOAT
+        self.askPrice9 = EMPTY_FLOAT
+        self.askPrice10 = EMPTY_FLOAT   
+        
+        self.bidVolume1 = EMPTY_FLOAT
+        self.bidVolume2 = EMPTY_FLOAT
+        self.bidVolume3 = EMPTY_FLOAT
+        self.bidVolume4 = EMPTY_FLOAT
+        self.bidVolume5 = EMPTY_FLOAT
+        self.bidVolume6 = EMPTY_FLOAT
+        self.bidVolume7 = EMPTY_FLOAT
+        self.bidVolume8 = EMPTY_FLOAT
+        self.bidVolume9 = EMPTY_FLOAT
+        self.bidVolume10 = EMPTY_FLOAT
+        
+        self.askVolume1 = EMPTY_FLOAT
+        self.askVolume2 = EMPTY_FLOAT
+        self.askVolume3 = EMPTY_FLOAT
+        self.askVolume4 = EMPTY_FLOAT
+        self.askVolume5 = EMPTY_FLOAT       
+        self.askVolume6 = EMPTY_FLOAT
+        self.askVolume7 = EMPTY_FLOAT
+        self.askVolume8 = EMPTY_FLOAT
+        self.askVolume9 = EMPTY_FLOAT
+        self.askVolume10 = EMPTY_FLOAT
+
+    #----------------------------------------------------------------------
+    def copy(self):
+        """复制对象（浅复制）"""
+        new = _newObject(VtCompactTickData)
+        new.gatewayName = self.gatewayName
+        new.rawData = self.rawData
+        new.symbol = self.symbol
+        new.exchange = self.exchange
+        new.vtSymbol = self.vtSymbol
+        new.lastPrice = self.lastPrice
+        new.lastVolume = self.lastVolume
+        new.volume = self.volume
+        new.openInterest = self.openInterest
+        new.time = self.time
+        new.date = self.date
+        new.datetime = self.datetime
+        new.type = self.type
+        new.volumeChange = self.volumeChange
+        new.localTime = self.localTime
+        new.lastTradedTime = self.lastTradedTime
+        new.openPrice = self.openPrice
+        new.highPrice = self.highPrice
+        new.lowPrice = self.lowPrice
+        new.preClosePrice = self.preClosePrice
+        new.upperLimit = self.upperLimit
+        new.lowerLimit = self.lowerLimit
+        new.bidPrice1 = self.bidPrice1
+        new.bidPrice2 = self.bidPrice2
+        new.bidPrice3 = self.bidPrice3
+        new.bidPrice4 = self.bidPrice4
+        new.bidPrice5 = self.bidPrice5
+        new.bidPrice6 = self.bidPrice6
+        new.bidPrice7 = self.bidPrice7
+        new.bidPrice8 = self.bidPrice8
+        new.bidPrice9 = self.bidPrice9
+        new.bidPrice10 = self.bidPrice10
+        new.askPrice1 = self.askPrice1
+        new.askPrice2 = self.askPrice2
+        new.askPrice3 = self.askPrice3
+        new.askPrice4 = self.askPrice4
+        new.askPrice5 = self.askPrice5
+        new.askPrice6 = self.askPrice6
+        new.askPrice7 = self.askPrice7
+        new.askPrice8 = self.askPrice8
+        new.askPrice9 = self.askPrice9
+        new.askPrice10 = self.askPrice10
+        new.bidVolume1 = self.bidVolume1
+        new.bidVolume2 = self.bidVolume2
+        new.bidVolume3 = self.bidVolume3
+        new.bidVolume4 = self.bidVolume4
+        new.bidVolume5 = self.bidVolume5
+        new.bidVolume6 = self.bidVolume6
+        new.bidVolume7 = self.bidVolume7
+        new.bidVolume8 = self.bidVolume8
+        new.bidVolume9 = self.bidVolume9
+        new.bidVolume10 = self.bidVolume10
+        new.askVolume1 = self.askVolume1
+        new.askVolume2 = self.askVolume2
+        new.askVolume3 = self.askVolume3
+        new.askVolume4 = self.askVolume4
+        new.askVolume5 = self.askVolume5
+        new.askVolume6 = self.askVolume6
+        new.askVolume7 = self.askVolume7
+        new.askVolume8 = self.askVolume8
+        new.askVolume9 = self.askVolume9
+        new.askVolume10 = self.askVolume10
+        return new
+    
+    __copy__ = copy
+    
+    #----------------------------------------------------------------------
+    def toDict(self):
+        """转换为字典，相当于VtTickData的__dict__"""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromDict(cls, d):
+        """从字典创建对象，忽略不属于本类的字段"""
+        data = cls()
+        for name in cls.__slots__:
+            if name in d:
+                setattr(data, name, d[name])
+        return data
+
+
+########################################################################
+class VtCompactBarData(object):
+    """
+    使用__slots__的K线数据，字段名与VtBarData相同
+    每个对象不再持有__dict__，内存占用更少，copy也更快，
+    但不能添加VtBarData以外的字段
+    """
+    __slots__ = ('gatewayName', 'rawData', 'vtSymbol', 'symbol', 'exchange', 'open',
+                 'high', 'low', 'close', 'date', 'time', 'datetime', 'volume',
+                 'openInterest')
+
+    #----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.gatewayName = EMPTY_STRING         # Gateway名称        
+        self.rawData = None                     # 原始数据
+        
+        self.vtSymbol = EMPTY_STRING        # vt系统代码
+        self.symbol = EMPTY_STRING          # 代码
+        self.exchange = EMPTY_STRING        # 交易所
+    
+        self.open = EMPTY_FLOAT             # OHLC
+        self.high = EMPTY_FLOAT
+        self.low = EMPTY_FLOAT
+        self.close = EMPTY_FLOAT
+        
+        self.date = EMPTY_STRING            # bar开始的时间，日期
+        self.time = EMPTY_STRING            # 时间
+        self.datetime = None                # python的datetime时间对象
+        
+        self.volume = EMPTY_FLOAT           # 成交量
+        self.openInterest = EMPTY_INT       # 持仓量
+
+    #----------------------------------------------------------------------
+    def copy(self):
+        """复制对象（浅复制）"""
+        new = _newObject(VtCompactBarData)
+        new.gatewayName = self.gatewayName
+        new.rawData = self.rawData
+        new.vtSymbol = self.vtSymbol
+        new.symbol = self.symbol
+        new.exchange = self.exchange
+        new.open = self.open
+        new.high = self.high
+        new.low = self.low
+        new.close = self.close
+        new.date = self.date
+        new.time = self.time
+        new.datetime = self.datetime
+        new.volume = self.volume
+        new.openInterest = self.openInterest
+        return new
+    
+    __copy__ = copy
+    
+    #----------------------------------------------------------------------
+    def toDict(self):
+        """转换为字典，相当于VtBarData的__dict__"""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    #----------------------------------------------------------------------
+    @classmethod
+    def fromDict(cls, d):
+        """从字典创建对象，忽略不属于本类的字段"""
+        data = cls()
+        for name in cls.__slots__:
+            if name in d:
+                setattr(data, name, d[name])
+        return data
+
+
 ########################################################################
 class VtTradeData(VtBaseData):
     """成交数据类"""
@@ -0,0 +1,76 @@
+# encoding: UTF-8
+
+'''
+比较VtTickData/VtBarData与__slots__版本（VtCompactTickData/VtCompactBarData）的
+内存占用和复制耗时，结果换算为100万个对象
+
+运行：python -m vnpy.trader.vtObjectBenchmark [对象数量，默认100000]
+'''
+
+from __future__ import print_function
+
+import sys
+import tracemalloc
+from copy import copy
+from datetime import datetime
+from time import perf_counter
+
+from vnpy.trader.vtObject import VtTickData, VtBarData, VtCompactTickData, VtCompactBarData
+
+
+SCALE = 1000000
+
+
+#----------------------------------------------------------------------
+def createData(dataClass):
+    """创建一个填充了字段的数据对象"""
+    data = dataClass()
+    data.vtSymbol = 'BTC-USD-SWAP:OKEX'
+    data.symbol = 'BTC-USD-SWAP'
+    data.exchange = 'OKEX'
+    data.datetime = datetime.now()
+    if hasattr(data, 'bidPrice1'):
+        data.lastPrice = 10000.0
+        data.bidPrice1 = 9999.5
+        data.askPrice1 = 10000.5
+    else:
+        data.close = 10000.0
+    return data
+
+
+#----------------------------------------------------------------------
+def measure(dataClass, count):
+    """返回（100万个对象的内存MB，100万次复制秒数）"""
+    data = createData(dataClass)
+    
+    tracemalloc.start()
+    dataList = [copy(data) for i in range(count)]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del dataList
+    
+    start = perf_counter()
+    for i in range(count):
+        copy(data)
+    cost = perf_counter() - start
+    
+    ratio = SCALE / count
+    return memory * ratio / 1024 / 1024, cost * ratio
+
+
+#----------------------------------------------------------------------
+def main():
+    """运行测试"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(u'%-20s %12s %12s' % ('class', 'MB/1M', 'copy s/1M'))
+    for old, new in ((VtTickData, VtCompactTickData), (VtBarData, VtCompactBarData)):
+        oldMemory, oldCost = measure(old, count)
+        newMemory, newCost = measure(new, count)
+        print(u'%-20s %12.1f %12.2f' % (old.__name__, oldMemory, oldCost))
+        print(u'%-20s %12.1f %12.2f' % (new.__name__, newMemory, newCost))
+        print(u'%-20s %11.0f%% %11.0f%%' % ('reduction', (1 - newMemory / oldMemory) * 100,
+                                           (1 - newCost / oldCost) * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# encoding: UTF-8
+
+'''
+本文件实现了本地的行情数据文件存储，每个合约每天一个只追加写入的文件。
+
+文件内容为定长的numpy结构化记录，未压缩的文件可以直接用np.memmap读取；
+也可以选择按写入批次分块压缩（zstd/lz4需要安装zstandard/lz4，zlib为标准库）。
+合约代码等每条记录都相同的字段，以及记录格式，保存在合约目录下的meta.json中。
+
+目录结构：{root}/{tick|bar}/{vtSymbol}/{YYYYMMDD}.dat|.zst|.lz4|.zlib
+'''
+
+import os
+import json
+import struct
+from datetime import datetime, timedelta
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from vnpy.trader.vtObject import VtTickData, VtBarData
+
+
+TICK_STORE = 'tick'
+BAR_STORE = 'bar'
+
+META_FILE = 'meta.json'
+BLOCK_HEADER = struct.Struct('<II')     # 压缩块的头部：压缩后的字节数，记录数量
+
+SUFFIX_DICT = {
+    None: '.dat',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+    'zlib': '.zlib'
+}
+
+STRING_FIELDS = ['symbol', 'exchange', 'vtSymbol', 'gatewayName']   # 保存在meta中的字段
+TIME_FIELDS = ['date', 'time']                                      # 读取时根据datetime还原的字段
+
+
+#----------------------------------------------------------------------
+def makeDtype(dataClass):
+    """根据数据类的数值字段生成定长记录格式"""
+    fields = [('datetime', 'M8[ns]')]
+    for name, value in dataClass().__dict__.items():
+        # 数字货币的持仓量、成交量可能是小数，统一保存为浮点数
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            fields.append((name, '<f8'))
+    return np.dtype(fields)
+
+
+DTYPE_DICT = {
+    TICK_STORE: makeDtype(VtTickData),
+    BAR_STORE: makeDtype(VtBarData)
+}
+
+
+#----------------------------------------------------------------------
+def getCodec(compression):
+    """获取压缩和解压函数，按需导入可选的压缩库"""
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    elif compression == 'lz4':
+        import lz4.frame
+        return lz4.frame.compress, lz4.frame.decompress
+    elif compression == 'zlib':
+        import zlib
+        return zlib.compress, zlib.decompress
+    raise ValueError(u'不支持的压缩方式：%s' %compression)
+
+
+########################################################################
+class DataStore(object):
+    """本地行情文件存储"""
+
+    #----------------------------------------------------------------------
+    def __init__(self, root, compression=None):
+        """Constructor"""
+        self.root = root
+        self.compression = compression
+        self.suffix = SUFFIX_DICT[compression]
+        self.compress = None
+        if compression:
+            self.compress = getCodec(compression)[0]
+
+        self.metaDict = {}  # 已写入meta的合约目录
+        self.lock = Lock()
+
+    #----------------------------------------------------------------------
+    def getSymbolPath(self, kind, vtSymbol):
+        """合约目录"""
+        return os.path.join(self.root, kind, vtSymbol.replace(':', '_'))
+
+    #----------------------------------------------------------------------
+    def writeMeta(self, path, kind, d):
+        """首次写入合约目录时保存记录格式和字符串字段"""
+        if path in self.metaDict:
+            return
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        metaPath = os.path.join(path, META_FILE)
+        if not os.path.isfile(metaPath):
+            meta = {
+                'kind': kind,
+                'dtype': DTYPE_DICT[kind].descr,
+                'strings': {name: d.get(name, '') for name in STRING_FIELDS}
+            }
+            with open(metaPath, 'w') as f:
+                json.dump(meta, f, indent=4)
+        self.metaDict[path] = True
+
+    #----------------------------------------------------------------------
+    def toRecords(self, kind, docs):
+        """把数据字典列表转换为定长记录"""
+        dtype = DTYPE_DICT[kind]
+        records = np.zeros(len(docs), dtype=dtype)
+        records['datetime'] = [d['datetime'] for d in docs]
+        for name in dtype.names[1:]:
+            records[name] = [d.get(name) or 0 for d in docs]
+        return records
+
+    #----------------------------------------------------------------------
+    def write(self, kind, vtSymbol, docs):
+        """追加写入一批数据（VtTickData或者VtBarData的__dict__），按日期分文件"""
+        if not docs:
+            return
+
+        path = self.getSymbolPath(kind, vtSymbol)
+        records = self.toRecords(kind, docs)
+        days = records['datetime'].astype('M8[D]')
+
+        with self.lock:
+            self.writeMeta(path, kind, docs[0])
+
+            for day in np.unique(days):
+                dayRecords = records[days == day]
+                fileName = pd.Timestamp(day).strftime('%Y%m%d') + self.suffix
+                with open(os.path.join(path, fileName), 'ab') as f:
+                    if self.compress:
+                        block = self.compress(dayRecords.tobytes())
+                        f.write(BLOCK_HEADER.pack(len(block), len(dayRecords)))
+                    else:
+                        block = dayRecords.tobytes()
+                    f.write(block)
+
+    #----------------------------------------------------------------------
+    def readFile(self, fileName, dtype):
+        """读取单个文件，未压缩的文件使用内存映射"""
+        suffix = os.path.splitext(fileName)[1]
+        if suffix == SUFFIX_DICT[None]:
+            if not os.path.getsize(fileName):
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(fileName, dtype=dtype, mode='r')
+
+        compression = {v: k for k, v in SUFFIX_DICT.items()}[suffix]
+        decompress = getCodec(compression)[1]
+        blocks = []
+        with open(fileName, 'rb') as f:
+            header = f.read(BLOCK_HEADER.size)
+            while len(header) == BLOCK_HEADER.size:
+                size, count = BLOCK_HEADER.unpack(header)
+                blocks.append(np.frombuffer(decompress(f.read(size)), dtype=dtype, count=count))
+                header = f.read(BLOCK_HEADER.size)
+
+        if not blocks:
+            return np.zeros(0, dtype=dtype)
+        return np.concatenate(blocks)
+
+    #----------------------------------------------------------------------
+    def getDays(self, kind, vtSymbol):
+        """已有数据文件的日期列表"""
+        path = self.getSymbolPath(kind, vtSymbol)
+        if not os.path.isdir(path):
+            return []
+        return sorted(set(os.path.splitext(name)[0] for name in os.listdir(path) if name != META_FILE))
+
+    #----------------------------------------------------------------------
+    def read(self, kind, vtSymbol, start, end):
+        """
+        读取[start, end)范围内的数据，返回DataFrame，列与数据库中的记录一致
+        没有数据时返回None
+        """
+        path = self.getSymbolPath(kind, vtSymbol)
+        metaPath = os.path.join(path, META_FILE)
+        if not os.path.isfile(metaPath):
+            return None
+
+        with open(metaPath) as f:
+            meta = json.load(f)
+        dtype = np.dtype([tuple(field) for field in meta['dtype']])
+
+        arrays = []
+        day = start.date()
+        while day <= (end - timedelta(microseconds=1)).date():
+            prefix = os.path.join(path, day.strftime('%Y%m%d'))
+            for suffix in SUFFIX_DICT.values():
+                if os.path.isfile(prefix + suffix):
+                    arrays.append(self.readFile(prefix + suffix, dtype))
+            day += timedelta(days=1)
+
+        if not arrays:
+            return None
+
+        records = np.concatenate(arrays)
+        dt = records['datetime']
+        records = records[(dt >= np.datetime64(start)) & (dt < np.datetime64(end))]
+        if not len(records):
+            return None
+
+        df = pd.DataFrame(records)
+        for name, value in meta['strings'].items():
+            df[name] = value
+        df['date'] = df['datetime'].dt.strftime('%Y%m%d')
+        df['time'] = df['datetime'].dt.strftime('%H:%M:%S.%f')
+        return df
@@ -4,6 +4,7 @@ import numpy as np
 import talib
 import pandas as  pd
 from datetime import datetime, time, timedelta
+from collections import deque
 
 from vnpy.trader.vtObject import VtBarData
 DATETIME_FORMAT = '%Y%m%d %H:%M:%S'
@@ -316,6 +317,8 @@ class ArrayManager(object):
         self.count = 0  # 缓存计数
         self.size = size  # 缓存大小
         self.inited = False  # True if count>=size
+        self.finished = True  # 最新的K线是否已经走完
+        self.streams = []  # 流式指标
 
         dt=np.dtype([('datetime','U18'),('open',np.float64),('high',np.float64),('low',np.float64),('close',np.float64),('volume',np.float64)])
         self.array=np.array([('00010101 00:00:01',0.0,0.0,0.0,0.0,0.0)]*size,dtype=dt)
@@ -325,8 +328,10 @@ class ArrayManager(object):
         if bar:  # 如果是实盘K线
             if not self.finished:
                 self.finished = True
+                self.updateStreams(bar)
                 return
 
+            self.updateStreams(bar)
             self.count += 1
             if not self.inited and self.count >= self.size:
                 self.inited = True
@@ -371,6 +376,21 @@ class ArrayManager(object):
             self.array['low'][-1] = min(float(bar.low),self.array['low'][-1])
             self.array['close'][-1] = float(bar.close)
             self.array['volume'][-1] += float(bar.volume)
+
+    # ----------------------------------------------------------------------
+    def addStream(self, indicator):
+        """
+        添加流式指标，之后每根走完的K线都会在updateBar中同步更新该指标
+        未走完的K线（updateArray）不参与流式指标的计算
+        """
+        self.streams.append(indicator)
+        return indicator
+
+    # ----------------------------------------------------------------------
+    def updateStreams(self, bar):
+        """更新流式指标"""
+        for indicator in self.streams:
+            indicator.updateBar(bar)
     # ----------------------------------------------------------------------
     @property
     def open(self):
@@ -497,4 +517,644 @@ class ArrayManager(object):
 
         if array:
             return up, down
-        return up[-1], down[-1]
\ No newline at end of file
+        return up[-1], down[-1]
+
+# ########################################################################
+class RingArrayManager(ArrayManager):
+    """
+    环形缓存的K线序列管理工具，接口和ArrayManager一致
+    1. 每根K线只写入固定位置，更新开销与size无关
+    2. 数据在长度为2*size的数组中保存两份，指标计算时直接返回连续的视图，不复制数据
+    3. 时间内部保存为int64的毫秒数（按K线时间的墙上时间计算），可通过timestamp获取；
+       datetime与ArrayManager一样返回DATETIME_FORMAT格式的字符串序列，在访问时转换
+    4. updateArray开始新的未走完K线时，最高价、最低价取该K线的值，成交量从0开始累加；
+       ArrayManager会沿用上一根K线留下的最高价、最低价和成交量，两者在未走完K线上的结果不同
+    """
+    EPOCH = datetime(1970, 1, 1)
+    fields = ['open', 'high', 'low', 'close', 'volume']
+
+    # ----------------------------------------------------------------------
+    def __init__(self, size=100):
+        """Constructor"""
+        self.count = 0  # 缓存计数
+        self.size = size  # 缓存大小
+        self.inited = False  # True if count>=size
+        self.finished = True  # 最新的K线是否已经走完
+        self.streams = []  # 流式指标
+
+        self.pos = size - 1  # 最新数据在环形缓存中的位置
+        self.buffer = {name: np.zeros(size * 2, dtype=np.float64) for name in self.fields}
+        self.buffer['datetime'] = np.zeros(size * 2, dtype=np.int64)
+        self.datetimeCache = (None, None)  # (count, 字符串序列)
+
+    # ----------------------------------------------------------------------
+    def toTimestamp(self, dt):
+        """datetime转换为毫秒时间戳"""
+        return (dt.replace(tzinfo=None) - self.EPOCH) // timedelta(milliseconds=1)
+
+    # ----------------------------------------------------------------------
+    def setValue(self, name, value):
+        """写入最新位置，同时写入镜像位置"""
+        array = self.buffer[name]
+        array[self.pos] = value
+        array[self.pos + self.size] = value
+
+    # ----------------------------------------------------------------------
+    def getValue(self, name):
+        """读取最新位置的数据"""
+        return self.buffer[name][self.pos]
+
+    # ----------------------------------------------------------------------
+    def moveNext(self):
+        """环形缓存前移一位"""
+        self.pos = (self.pos + 1) % self.size
+        self.count += 1
+        if not self.inited and self.count >= self.size:
+            self.inited = True
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """更新K线"""
+        if bar:  # 如果是实盘K线
+            if not self.finished:
+                self.finished = True
+                self.updateStreams(bar)
+                return
+
+            self.updateStreams(bar)
+            self.moveNext()
+            self.setValue('datetime', self.toTimestamp(bar.datetime))
+            self.setValue('open', float(bar.open))
+            self.setValue('high', float(bar.high))
+            self.setValue('low', float(bar.low))
+            self.setValue('close', float(bar.close))
+            self.setValue('volume', float(bar.volume))
+
+    # ----------------------------------------------------------------------
+    def updateArray(self, bar):
+        """更新未走完的K线"""
+        if bar:  # 如果是实盘K线
+            if self.finished:
+                self.moveNext()
+                self.setValue('datetime', self.toTimestamp(bar.datetime))
+                self.setValue('open', float(bar.open))
+                self.setValue('high', float(bar.high))
+                self.setValue('low', float(bar.low))
+                self.setValue('volume', 0.0)
+
+            self.finished = False
+            self.setValue('high', max(float(bar.high), self.getValue('high')))
+            self.setValue('low', min(float(bar.low), self.getValue('low')))
+            self.setValue('close', float(bar.close))
+            self.setValue('volume', self.getValue('volume') + float(bar.volume))
+
+    # ----------------------------------------------------------------------
+    def getArray(self, name):
+        """获取按时间先后排列的连续序列（视图，不复制数据）"""
+        begin = self.pos + 1
+        return self.buffer[name][begin:begin + self.size]
+
+    # ----------------------------------------------------------------------
+    @property
+    def open(self):
+        """获取开盘价序列"""
+        return self.getArray('open')
+
+    # ----------------------------------------------------------------------
+    @property
+    def high(self):
+        """获取最高价序列"""
+        return self.getArray('high')
+
+    # ----------------------------------------------------------------------
+    @property
+    def low(self):
+        """获取最低价序列"""
+        return self.getArray('low')
+
+    # ----------------------------------------------------------------------
+    @property
+    def close(self):
+        """获取收盘价序列"""
+        return self.getArray('close')
+
+    # ----------------------------------------------------------------------
+    @property
+    def volume(self):
+        """获取成交量序列"""
+        return self.getArray('volume')
+
+    # ----------------------------------------------------------------------
+    @property
+    def timestamp(self):
+        """获取时间戳序列（int64毫秒）"""
+        return self.getArray('datetime')
+
+    # ----------------------------------------------------------------------
+    @property
+    def datetime(self):
+        """获取时间序列，与ArrayManager相同为DATETIME_FORMAT格式的字符串，尚未写入的位置为'00010101 00:00:01'"""
+        count, array = self.datetimeCache
+        if count != self.count:
+            stamps = self.timestamp
+            array = np.asarray(pd.to_datetime(stamps, unit='ms').strftime(DATETIME_FORMAT), dtype='U18')
+            array[np.arange(self.size) < self.size - self.count] = '00010101 00:00:01'
+            self.datetimeCache = (self.count, array)
+        return array
+
+    # ----------------------------------------------------------------------
+    def to_dataframe(self):
+        """提供DataFrame"""
+        df = pd.DataFrame({name: self.getArray(name) for name in self.fields})
+        df.insert(0, 'datetime', self.datetime)
+        return df
+
+
+# ########################################################################
+class StreamIndicator(object):
+    """
+    流式指标基类
+    每根K线只用新数据更新内部状态，开销与回看周期无关，
+    数值和ArrayManager中对应的talib指标一致，数据不足时为nan
+    
+    子类需要实现update方法，传入新数据更新count和value并返回最新的指标值；
+    基类的updateBar以收盘价调用update(close)，需要最高价、最低价的指标应重载updateBar
+    """
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """Constructor"""
+        self.count = 0  # 已经更新的K线数量
+        self.value = np.nan  # 最新的指标值
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新，默认使用收盘价"""
+        return self.update(float(bar.close))
+
+    # ----------------------------------------------------------------------
+    @property
+    def inited(self):
+        """指标是否已经有有效值"""
+        return not np.isnan(self.value)
+
+
+# ########################################################################
+class StreamSma(StreamIndicator):
+    """简单均线，滚动求和"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamSma, self).__init__()
+        self.n = n
+        self.window = deque()
+        self.total = 0.0
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        self.window.append(value)
+        self.total += value
+        if len(self.window) > self.n:
+            self.total -= self.window.popleft()
+        if len(self.window) == self.n:
+            self.value = self.total / self.n
+        return self.value
+
+
+# ########################################################################
+class StreamStd(StreamIndicator):
+    """标准差（总体标准差，和talib.STDDEV一致），滑动窗口的Welford算法"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamStd, self).__init__()
+        self.n = n
+        self.window = deque()
+        self.mean = 0.0
+        self.m2 = 0.0  # 离差平方和
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        self.window.append(value)
+        if len(self.window) <= self.n:
+            delta = value - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (value - self.mean)
+        else:
+            old = self.window.popleft()
+            oldMean = self.mean
+            self.mean += (value - old) / self.n
+            self.m2 += (value - old) * (value - self.mean + old - oldMean)
+
+        if len(self.window) == self.n:
+            self.value = np.sqrt(max(self.m2, 0.0) / self.n)
+        return self.value
+
+
+# ########################################################################
+class StreamEma(StreamIndicator):
+    """指数均线，前n个数据的简单平均作为初始值（和talib.EMA一致）"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamEma, self).__init__()
+        self.n = n
+        self.k = 2.0 / (n + 1)
+        self.total = 0.0
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        if self.count < self.n:
+            self.total += value
+        elif self.count == self.n:
+            self.value = (self.total + value) / self.n
+        else:
+            self.value += (value - self.value) * self.k
+        return self.value
+
+
+# ########################################################################
+class StreamAtr(StreamIndicator):
+    """ATR指标，Wilder平滑"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamAtr, self).__init__()
+        self.n = n
+        self.preClose = None
+        self.total = 0.0
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新"""
+        return self.update(float(bar.high), float(bar.low), float(bar.close))
+
+    # ----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """数值更新"""
+        self.count += 1
+        preClose = self.preClose
+        self.preClose = close
+        if preClose is None:
+            return self.value
+
+        tr = max(high - low, abs(high - preClose), abs(low - preClose))
+        if self.count <= self.n:
+            self.total += tr
+        elif self.count == self.n + 1:
+            self.value = (self.total + tr) / self.n
+        elif self.count > self.n + 1:
+            self.value = (self.value * (self.n - 1) + tr) / self.n
+        return self.value
+
+
+# ########################################################################
+class StreamRsi(StreamIndicator):
+    """RSI指标，Wilder平滑"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamRsi, self).__init__()
+        self.n = n
+        self.preClose = None
+        self.avgGain = 0.0
+        self.avgLoss = 0.0
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        preClose = self.preClose
+        self.preClose = value
+        if preClose is None:
+            return self.value
+
+        diff = value - preClose
+        gain = diff if diff > 0 else 0.0
+        loss = -diff if diff < 0 else 0.0
+        if self.count <= self.n + 1:
+            self.avgGain += gain / self.n
+            self.avgLoss += loss / self.n
+            if self.count < self.n + 1:
+                return self.value
+        else:
+            self.avgGain = (self.avgGain * (self.n - 1) + gain) / self.n
+            self.avgLoss = (self.avgLoss * (self.n - 1) + loss) / self.n
+
+        total = self.avgGain + self.avgLoss
+        if total:
+            self.value = 100.0 * self.avgGain / total
+        else:
+            self.value = 0.0
+        return self.value
+
+
+# ########################################################################
+class StreamCci(StreamIndicator):
+    """
+    CCI指标
+    均值滚动更新，平均绝对偏差依赖当前均值，只能遍历窗口计算，开销为O(n)
+    """
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamCci, self).__init__()
+        self.n = n
+        self.sma = StreamSma(n)
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新"""
+        return self.update(float(bar.high), float(bar.low), float(bar.close))
+
+    # ----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """数值更新"""
+        self.count += 1
+        tp = (high + low + close) / 3
+        mean = self.sma.update(tp)
+        if self.sma.inited:
+            deviation = sum(abs(x - mean) for x in self.sma.window) / self.n
+            if deviation:
+                self.value = (tp - mean) / (0.015 * deviation)
+            else:
+                self.value = 0.0
+        return self.value
+
+
+# ########################################################################
+class StreamMacd(StreamIndicator):
+    """
+    MACD指标，value为(macd, signal, hist)
+    和talib.MACD一致：快慢均线都在第slowPeriod根K线处用各自周期的简单平均初始化
+    """
+    # ----------------------------------------------------------------------
+    def __init__(self, fastPeriod, slowPeriod, signalPeriod):
+        """Constructor"""
+        super(StreamMacd, self).__init__()
+        if slowPeriod < fastPeriod:
+            fastPeriod, slowPeriod = slowPeriod, fastPeriod
+        self.fastPeriod = fastPeriod
+        self.slowPeriod = slowPeriod
+        self.kFast = 2.0 / (fastPeriod + 1)
+        self.kSlow = 2.0 / (slowPeriod + 1)
+
+        self.window = deque(maxlen=slowPeriod)  # 初始化前的收盘价缓存
+        self.fast = np.nan
+        self.slow = np.nan
+        self.signal = StreamEma(signalPeriod)
+        self.value = (np.nan, np.nan, np.nan)
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        if self.count < self.slowPeriod:
+            self.window.append(value)
+            return self.value
+        elif self.count == self.slowPeriod:
+            self.window.append(value)
+            closes = list(self.window)
+            self.fast = sum(closes[-self.fastPeriod:]) / self.fastPeriod
+            self.slow = sum(closes) / self.slowPeriod
+            self.window.clear()
+        else:
+            self.fast += (value - self.fast) * self.kFast
+            self.slow += (value - self.slow) * self.kSlow
+
+        macd = self.fast - self.slow
+        signal = self.signal.update(macd)
+        if self.signal.inited:
+            self.value = (macd, signal, macd - signal)
+        return self.value
+
+    # ----------------------------------------------------------------------
+    @property
+    def inited(self):
+        """指标是否已经有有效值"""
+        return self.signal.inited
+
+
+# ########################################################################
+class StreamAdx(StreamIndicator):
+    """ADX指标，Wilder平滑（和talib.ADX的计算步骤一致）"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamAdx, self).__init__()
+        self.n = n
+        self.preHigh = None
+        self.preLow = None
+        self.preClose = None
+
+        self.plusDM = 0.0
+        self.minusDM = 0.0
+        self.tr = 0.0
+        self.sumDX = 0.0
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新"""
+        return self.update(float(bar.high), float(bar.low), float(bar.close))
+
+    # ----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """数值更新"""
+        self.count += 1
+        if self.preClose is None:
+            self.preHigh, self.preLow, self.preClose = high, low, close
+            return self.value
+
+        n = self.n
+        diffP = high - self.preHigh
+        diffM = self.preLow - low
+        tr = max(high - low, abs(high - self.preClose), abs(low - self.preClose))
+        self.preHigh, self.preLow, self.preClose = high, low, close
+
+        # 前n-1根只做累加，之后Wilder平滑
+        if self.count > n:
+            self.minusDM -= self.minusDM / n
+            self.plusDM -= self.plusDM / n
+            self.tr -= self.tr / n
+        if diffM > 0 and diffP < diffM:
+            self.minusDM += diffM
+        elif diffP > 0 and diffP > diffM:
+            self.plusDM += diffP
+        self.tr += tr
+
+        if self.count <= n:
+            return self.value
+
+        dx = None
+        if not -1e-8 < self.tr < 1e-8:
+            minusDI = 100.0 * self.minusDM / self.tr
+            plusDI = 100.0 * self.plusDM / self.tr
+            total = minusDI + plusDI
+            if not -1e-8 < total < 1e-8:
+                dx = 100.0 * abs(minusDI - plusDI) / total
+
+        # 前n个DX取平均作为初始ADX
+        if self.count <= 2 * n:
+            if dx is not None:
+                self.sumDX += dx
+            if self.count == 2 * n:
+                self.value = self.sumDX / n
+        elif dx is not None:
+            self.value = (self.value * (n - 1) + dx) / n
+        return self.value
+
+
+# ########################################################################
+class StreamDonchian(StreamIndicator):
+    """唐奇安通道，value为(up, down)，使用单调队列维护窗口最高最低价"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n):
+        """Constructor"""
+        super(StreamDonchian, self).__init__()
+        self.n = n
+        self.maxQueue = deque()  # (序号, 最高价)，价格单调递减
+        self.minQueue = deque()  # (序号, 最低价)，价格单调递增
+        self.value = (np.nan, np.nan)
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新"""
+        return self.update(float(bar.high), float(bar.low))
+
+    # ----------------------------------------------------------------------
+    def update(self, high, low):
+        """数值更新"""
+        self.count += 1
+        i = self.count
+
+        while self.maxQueue and self.maxQueue[-1][1] <= high:
+            self.maxQueue.pop()
+        self.maxQueue.append((i, high))
+        if self.maxQueue[0][0] <= i - self.n:
+            self.maxQueue.popleft()
+
+        while self.minQueue and self.minQueue[-1][1] >= low:
+            self.minQueue.pop()
+        self.minQueue.append((i, low))
+        if self.minQueue[0][0] <= i - self.n:
+            self.minQueue.popleft()
+
+        if i >= self.n:
+            self.value = (self.maxQueue[0][1], self.minQueue[0][1])
+        return self.value
+
+    # ----------------------------------------------------------------------
+    @property
+    def inited(self):
+        """指标是否已经有有效值"""
+        return self.count >= self.n
+
+
+# ########################################################################
+class StreamBoll(StreamIndicator):
+    """布林通道，value为(up, down)"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n, dev):
+        """Constructor"""
+        super(StreamBoll, self).__init__()
+        self.dev = dev
+        self.sma = StreamSma(n)
+        self.std = StreamStd(n)
+        self.value = (np.nan, np.nan)
+
+    # ----------------------------------------------------------------------
+    def update(self, value):
+        """数值更新"""
+        self.count += 1
+        mid = self.sma.update(value)
+        std = self.std.update(value)
+        self.value = (mid + std * self.dev, mid - std * self.dev)
+        return self.value
+
+    # ----------------------------------------------------------------------
+    @property
+    def inited(self):
+        """指标是否已经有有效值"""
+        return self.sma.inited
+
+
+# ########################################################################
+class StreamKeltner(StreamIndicator):
+    """肯特纳通道，value为(up, down)"""
+    # ----------------------------------------------------------------------
+    def __init__(self, n, dev):
+        """Constructor"""
+        super(StreamKeltner, self).__init__()
+        self.dev = dev
+        self.sma = StreamSma(n)
+        self.atr = StreamAtr(n)
+        self.value = (np.nan, np.nan)
+
+    # ----------------------------------------------------------------------
+    def updateBar(self, bar):
+        """K线更新"""
+        return self.update(float(bar.high), float(bar.low), float(bar.close))
+
+    # ----------------------------------------------------------------------
+    def update(self, high, low, close):
+        """数值更新"""
+        self.count += 1
+        mid = self.sma.update(close)
+        atr = self.atr.update(high, low, close)
+        self.value = (mid + atr * self.dev, mid - atr * self.dev)
+        return self.value
+
+    # ----------------------------------------------------------------------
+    @property
+    def inited(self):
+        """指标是否已经有有效值"""
+        return self.atr.inited
+
+
+#----------------------------------------------------------------------
+def benchmarkStream(bars=5000, lookbacks=(20, 200, 2000)):
+    """比较ArrayManager全量计算和流式指标的单根K线耗时"""
+    from timeit import default_timer
+
+    np.random.seed(0)
+    close = np.cumsum(np.random.randn(bars)) + 10000
+    high = close + np.abs(np.random.randn(bars))
+    low = close - np.abs(np.random.randn(bars))
+    barList = []
+    for i in range(bars):
+        bar = VtBarData()
+        bar.datetime = datetime(2018, 1, 1) + timedelta(minutes=i)
+        bar.open = bar.close = close[i]
+        bar.high = high[i]
+        bar.low = low[i]
+        barList.append(bar)
+
+    print(u'lookback   ArrayManager(us/bar)   Stream(us/bar)')
+    for n in lookbacks:
+        am = ArrayManager(n * 2 + 1)
+        start = default_timer()
+        for bar in barList:
+            am.updateBar(bar)
+            am.sma(n), am.std(n), am.atr(n), am.rsi(n), am.adx(n)
+            am.macd(12, 26, 9), am.donchian(n)
+        amCost = (default_timer() - start) / bars * 1e6
+
+        am = ArrayManager(1)
+        for indicator in [StreamSma(n), StreamStd(n), StreamAtr(n), StreamRsi(n),
+                          StreamAdx(n), StreamMacd(12, 26, 9), StreamDonchian(n)]:
+            am.addStream(indicator)
+        start = default_timer()
+        for bar in barList:
+            am.updateBar(bar)
+        streamCost = (default_timer() - start) / bars * 1e6
+
+        print(u'%8d   %20.1f   %14.1f' % (n, amCost, streamCost))
+
+
+if __name__ == '__main__':
+    benchmarkStream()